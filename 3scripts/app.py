@@ -1,30 +1,152 @@
-from flask import Flask, render_template_string
-import pandas as pd
+from flask import Flask, render_template_string, request, jsonify, abort
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import hashlib
+import json
 import os
-import plotly.graph_objects as go
+import sys
+import threading
 from plotly.subplots import make_subplots
 
+# Shared loaders live in scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+from track_cache import load_tracks, frame_extent
+from trace_render import packed_trace, pack_tracks
+from track_store import TrackStore
+from instrument import timed
+
 app = Flask(__name__)
 
+DATA_DIR = '../stadium_data'
+FILES = ['camL_1.csv', 'camM_1.csv', 'camR_1.csv']
+COLORS = {'camL_1.csv': 'blue', 'camM_1.csv': 'red', 'camR_1.csv': 'green'}
+CACHE_DIR = os.path.join(DATA_DIR, '.dashboard_cache')
+
+
+class PayloadCache:
+    """JSON payloads kept in an in-memory LRU and mirrored to disk
+
+    Keys already encode the source file versions, so entries never need
+    invalidating; stale ones simply stop being asked for. With cache_dir
+    None nothing is persisted (for values that are not JSON).
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_items=32):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, key):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key]
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value, persist=True):
+        if persist and self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._path(key) + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(value, f)
+            os.replace(tmp, self._path(key))
+        self._remember(key, value)
+
+    def _remember(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+
+cache = PayloadCache()
+# TrackStores for the windowed API, one per camera file version
+stores = PayloadCache(cache_dir=None, max_items=len(FILES))
+# Heavy work (CSV parsing, figure building) runs here, never in a request
+worker = ThreadPoolExecutor(max_workers=1)
+pending = {}
+# Builds that raised, by key: served as errors instead of being queued again
+failed = {}
+pending_lock = threading.Lock()
+
+
+class BuildFailed(Exception):
+    """A background build raised; carries the key and the error message"""
+
+
+def file_version(file_path):
+    """Cheap identifier of a file's contents: modification time and size"""
+    stat = os.stat(file_path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def payload_key(kind, versions):
+    return kind + '-' + hashlib.sha1(json.dumps(versions, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def cached_or_schedule(key, build, target=cache):
+    """Value for key from target, or None after queueing build() on the worker
+
+    Raises BuildFailed if an earlier build for key raised. Keys encode the
+    file versions, so changing the files gives the build another chance.
+    """
+    value = target.get(key)
+    if value is not None:
+        return value
+    with pending_lock:
+        if key in failed:
+            raise BuildFailed(key, failed[key])
+        # The build may have finished since the first look
+        value = target.get(key)
+        if value is not None:
+            return value
+        if key not in pending:
+            def run():
+                try:
+                    target.put(key, build())
+                except Exception as error:
+                    app.logger.exception("Building %s failed", key)
+                    with pending_lock:
+                        failed[key] = f"{type(error).__name__}: {error}"
+                finally:
+                    with pending_lock:
+                        pending.pop(key, None)
+            pending[key] = worker.submit(run)
+    return None
+
 def analyze_csv(file_path):
-    data = pd.read_csv(file_path)
+    data = load_tracks(file_path)
     total_entries = len(data)
     unique_tracks = data['tracking_id'].nunique()
     total_frames = data['frame'].nunique()
     teams = sorted(data['team_id'].unique())
     
+    # Plain Python types so the analysis can be cached as JSON
     return {
         "file_name": os.path.basename(file_path),
-        "total_entries": total_entries,
-        "unique_tracks": unique_tracks,
-        "total_frames": total_frames,
-        "teams": teams
+        "total_entries": int(total_entries),
+        "unique_tracks": int(unique_tracks),
+        "total_frames": int(total_frames),
+        "teams": [int(t) for t in teams]
     }
 
-def create_3d_visualization():
-    data_dir = '../stadium_data'
-    files = ['camL_1.csv', 'camM_1.csv', 'camR_1.csv']
-    colors = {'camL_1.csv': 'blue', 'camM_1.csv': 'red', 'camR_1.csv': 'green'}
+@timed('figure.create_3d_visualization')
+def create_3d_visualization(data_dir=DATA_DIR, files=FILES):
+    colors = COLORS
     
     fig = make_subplots(
         rows=1, cols=1,
@@ -34,21 +156,11 @@ def create_3d_visualization():
     
     for file in files:
         file_path = os.path.join(data_dir, file)
-        data = pd.read_csv(file_path)
+        data = load_tracks(file_path)
         color = colors[file]
         
-        for track_id in data['tracking_id'].unique():
-            track_data = data[data['tracking_id'] == track_id]
-            fig.add_trace(
-                go.Scatter3d(
-                    x=track_data['pitch_x'],
-                    y=track_data['pitch_y'],
-                    z=track_data['frame'],
-                    mode='lines',
-                    line=dict(color=color, width=2),
-                    opacity=0.6
-                )
-            )
+        # All tracks of the camera in one trace
+        fig.add_trace(packed_trace(data, file, color=color))
     
     fig.update_layout(
         scene=dict(
@@ -63,13 +175,58 @@ def create_3d_visualization():
     
     return fig.to_html(full_html=False)
 
+def dashboard_payloads(data_dir=DATA_DIR, files=FILES):
+    """Analyses and figure for the current file versions, or None while they are built
+
+    Each analysis is keyed by its own file's version, the figure by all of them.
+    """
+    paths = [os.path.join(data_dir, file) for file in files]
+    versions = {os.path.basename(path): file_version(path) for path in paths}
+    analyses = [
+        cached_or_schedule(payload_key('analysis', {name: version}), lambda path=path: analyze_csv(path))
+        for path, (name, version) in zip(paths, versions.items())
+    ]
+    figure = cached_or_schedule(payload_key('figure', versions),
+                                lambda: {'html': create_3d_visualization(data_dir, files)})
+    return versions, analyses, figure
+
+@app.errorhandler(BuildFailed)
+def build_failed(error):
+    key, message = error.args
+    return render_template_string("""
+    <style> body { background-color: black; color: white; } </style>
+    <h1>CSV Analysis</h1>
+    <p>Building {{ key }} failed: {{ message }}</p>
+    """, key=key, message=message), 500
+
 @app.route('/')
 def index():
-    data_dir = '../stadium_data'
-    files = ['camL_1.csv', 'camM_1.csv', 'camR_1.csv']
-    analyses = [analyze_csv(os.path.join(data_dir, file)) for file in files]
-    plot_html = create_3d_visualization()
-    
+    versions, analyses, figure = dashboard_payloads()
+    if figure is None or any(a is None for a in analyses):
+        # Still warming up: come back shortly instead of blocking on CSV parsing
+        return render_template_string("""
+    <meta http-equiv="refresh" content="2">
+    <style> body { background-color: black; color: white; } </style>
+    <h1>CSV Analysis</h1>
+    <p>Preparing the dashboard...</p>
+    """), 202
+
+    etag = payload_key('page', versions)
+    if request.if_none_match.contains(etag):
+        return '', 304, {'ETag': f'"{etag}"'}
+
+    page = cache.get(etag)
+    if page is None:
+        page = render_dashboard(analyses, figure['html'])
+        # Rendering is cheap to redo, so the page itself is only kept in memory
+        cache.put(etag, page, persist=False)
+
+    response = app.make_response(page)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def render_dashboard(analyses, plot_html):
     html = """
     <style>
         body {
@@ -92,5 +249,225 @@ def index():
     
     return render_template_string(html, analyses=analyses, plot_html=plot_html)
 
+# Windowed trajectory API: the viewer only fetches the frames it shows
+
+# Windows up to this many frames are sent at full detail; longer ones keep
+# one point per track every window / LOD_FRAMES frames
+LOD_FRAMES = 1500
+
+def camera_store(file):
+    """TrackStore for one camera file, or None while the worker builds it
+
+    Stores are keyed by the file version, so a changed file gets a new one.
+    """
+    path = os.path.join(DATA_DIR, file)
+    key = payload_key('store', {file: file_version(path)})
+    return cached_or_schedule(key, lambda: TrackStore.from_csv(path), target=stores)
+
+PREPARING = ({'preparing': True}, 202, {'Retry-After': '1'})
+
+def encode_chunk(chunks, meta):
+    """Binary payload: uint32 header length, JSON header, then float32 x/y/z per camera
+
+    The header is padded to a multiple of 4 bytes so the arrays can be
+    viewed directly as Float32Array in the browser.
+    """
+    meta = dict(meta, cameras=[
+        {'name': name, 'color': COLORS.get(name, 'white'), 'points': len(packed['x']),
+         'tracks': packed['n_tracks']}
+        for name, packed in chunks
+    ])
+    header = json.dumps(meta).encode()
+    header += b' ' * (-(len(header) + 4) % 4)
+    parts = [np.uint32(len(header)).tobytes(), header]
+    for _, packed in chunks:
+        parts.extend(packed[axis].astype('<f4').tobytes() for axis in ('x', 'y', 'z'))
+    return b''.join(parts)
+
+@app.route('/api/meta')
+def api_meta():
+    """Frame extent of every camera, read from the track cache metadata"""
+    cameras = {}
+    preparing = False
+    for file in FILES:
+        path = os.path.join(DATA_DIR, file)
+        if not os.path.exists(path):
+            continue
+        extent = frame_extent(path)
+        if extent is None:
+            # Cache missing or stale: building the store rebuilds it
+            camera_store(file)
+            preparing = True
+        elif extent[0] is not None:
+            cameras[file] = {'first_frame': extent[0], 'last_frame': extent[1],
+                             'color': COLORS.get(file, 'white')}
+    if preparing:
+        return PREPARING
+    return jsonify(cameras=cameras, lod_frames=LOD_FRAMES)
+
+@app.route('/api/tracks')
+def api_tracks():
+    """Decimated tracks of the requested cameras for start <= frame <= end, x0 <= pitch_x <= x1"""
+    try:
+        start = int(request.args['start'])
+        end = int(request.args['end'])
+        x0 = float(request.args.get('x0', '-inf'))
+        x1 = float(request.args.get('x1', 'inf'))
+    except (KeyError, ValueError):
+        abort(400)
+    cameras = [c for c in request.args.get('cameras', ','.join(FILES)).split(',') if c]
+    if any(c not in FILES for c in cameras) or end < start:
+        abort(400)
+
+    bucket = max(1, -(-(end - start + 1) // LOD_FRAMES))
+    versions = {c: file_version(os.path.join(DATA_DIR, c)) for c in cameras}
+    etag = payload_key('tracks', [versions, start, end, x0, x1, bucket])
+    if request.if_none_match.contains(etag):
+        return '', 304, {'ETag': f'"{etag}"'}
+
+    camera_stores = [camera_store(camera) for camera in cameras]
+    if any(store is None for store in camera_stores):
+        return PREPARING
+
+    chunks = []
+    for camera, store in zip(cameras, camera_stores):
+        rows = store.frame_range(start, end)
+        keep = (rows['pitch_x'] >= x0) & (rows['pitch_x'] <= x1)
+        rows = {name: values[keep] for name, values in rows.items()}
+        chunks.append((camera, pack_tracks(rows, decimate='time' if bucket > 1 else None, bucket=bucket)))
+
+    response = app.make_response(encode_chunk(chunks, {'start': start, 'end': end, 'bucket': bucket}))
+    response.mimetype = 'application/octet-stream'
+    response.set_etag(etag)
+    return response
+
+VIEWER_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+<script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
+<style>
+    body { background-color: black; color: white; font-family: sans-serif; }
+    #controls > * { margin-right: 1em; }
+</style>
+</head>
+<body>
+<div id="controls">
+    <label>Frame <input type="range" id="start" min="0" max="0" value="0" style="width: 40%"></label>
+    <span id="label"></span>
+    <label>Window <select id="window">
+        <option value="1000">1000</option>
+        <option value="5000" selected>5000</option>
+        <option value="20000">20000</option>
+        <option value="200000">all</option>
+    </select></label>
+    <label>X <input id="x0" type="number" value="0" style="width: 5em"> -
+        <input id="x1" type="number" value="1000" style="width: 5em"></label>
+    <span id="cameras"></span>
+</div>
+<div id="plot" style="height: 90vh"></div>
+<script>
+var controller = null;
+var layout = {
+    paper_bgcolor: 'black', font: {color: 'white'}, uirevision: 'keep',
+    scene: {bgcolor: 'black', xaxis: {title: 'Pitch X'}, yaxis: {title: 'Pitch Y'}, zaxis: {title: 'Frame'}}
+};
+
+function decode(buffer) {
+    var length = new DataView(buffer).getUint32(0, true);
+    var header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, length)));
+    var offset = 4 + length;
+    var traces = header.cameras.map(function (camera) {
+        function axis() {
+            var values = new Float32Array(buffer, offset, camera.points);
+            offset += camera.points * 4;
+            return values;
+        }
+        return {
+            type: 'scatter3d', mode: 'lines', connectgaps: false, opacity: 0.6,
+            name: camera.name + ' (' + camera.tracks + ' tracks)',
+            x: axis(), y: axis(), z: axis(), line: {color: camera.color, width: 2}
+        };
+    });
+    return {header: header, traces: traces};
+}
+
+function load() {
+    var start = parseInt(document.getElementById('start').value, 10);
+    var end = start + parseInt(document.getElementById('window').value, 10) - 1;
+    var cameras = Array.from(document.querySelectorAll('#cameras input:checked')).map(function (box) { return box.value; });
+    var query = new URLSearchParams({
+        start: start, end: end, cameras: cameras.join(','),
+        x0: document.getElementById('x0').value, x1: document.getElementById('x1').value
+    });
+    if (controller) { controller.abort(); }
+    controller = new AbortController();
+    fetch('/api/tracks?' + query, {signal: controller.signal})
+        .then(function (response) {
+            if (response.status === 202) {
+                // Stores still being built on the server
+                document.getElementById('label').textContent = 'Loading cameras...';
+                setTimeout(load, 1000);
+                return null;
+            }
+            return response.arrayBuffer();
+        })
+        .then(function (buffer) {
+            if (buffer === null) { return; }
+            var chunk = decode(buffer);
+            document.getElementById('label').textContent =
+                start + ' - ' + end + (chunk.header.bucket > 1 ? ' (1 point / ' + chunk.header.bucket + ' frames)' : '');
+            Plotly.react('plot', chunk.traces, layout);
+        })
+        .catch(function (error) { if (error.name !== 'AbortError') { console.error(error); } });
+}
+
+var timer = null;
+function scheduleLoad() {
+    clearTimeout(timer);
+    timer = setTimeout(load, 100);
+}
+
+function start() {
+    fetch('/api/meta').then(function (response) {
+        if (response.status === 202) {
+            setTimeout(start, 1000);
+            return null;
+        }
+        return response.json();
+    }).then(function (meta) { if (meta !== null) { setup(meta); } });
+}
+
+function setup(meta) {
+    var names = Object.keys(meta.cameras);
+    var first = Math.min.apply(null, names.map(function (n) { return meta.cameras[n].first_frame; }));
+    var last = Math.max.apply(null, names.map(function (n) { return meta.cameras[n].last_frame; }));
+    var slider = document.getElementById('start');
+    slider.min = first;
+    slider.max = last;
+    slider.value = first;
+    names.forEach(function (name) {
+        var label = document.createElement('label');
+        label.innerHTML = '<input type="checkbox" value="' + name + '" checked> ' + name;
+        document.getElementById('cameras').appendChild(label);
+    });
+    document.querySelectorAll('#controls input, #controls select').forEach(function (input) {
+        input.addEventListener('input', scheduleLoad);
+    });
+    load();
+}
+
+start();
+</script>
+</body>
+</html>
+"""
+
+@app.route('/viewer')
+def viewer():
+    return VIEWER_HTML
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Start building the payloads before the first request arrives
+    dashboard_payloads()
+    app.run(debug=True)
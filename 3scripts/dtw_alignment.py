@@ -1,25 +1,179 @@
 import pandas as pd
 import numpy as np
-from fastdtw import fastdtw
-from scipy.spatial.distance import euclidean
+import os
+import sys
+
+# Overlap signals and the coarse lag estimate live in scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+from sync_estimator import overlap_rows, overlap_signals, estimate_sync_offset
+from track_cache import load_tracks
+from instrument import timed
+
+# Moves stored for the backtrack, in band coordinates
+DIAGONAL, VERTICAL, HORIZONTAL = 0, 1, 2
 
 def extract_features(data):
     """Extract features for alignment."""
     return data[["pitch_x", "pitch_y"]].values
 
-def calculate_dtw_offset(left_data, right_data):
-    """Calculate time offset using Dynamic Time Warping."""
+def frame_descriptors(data, overlap_x_range, y_range=(0, 700), y_bins=8):
+    """Per-frame occupancy histogram along y inside the overlap band
+
+    Returns (frame_start, descriptors) with descriptors of shape (n_frames, y_bins).
+    """
+    frames = np.asarray(data['frame'])[overlap_rows(data, overlap_x_range)]
+    if len(frames) == 0:
+        raise ValueError("No rows in the overlap region")
+    start = int(frames.min())
+    signals = overlap_signals(data, start, int(frames.max()) - start + 1, overlap_x_range,
+                              y_range, y_bins, teams=())
+    return start, np.ascontiguousarray(signals[:y_bins].T, dtype=np.float64)
+
+def banded_dtw(a, b, center, radius, block=1024):
+    """DTW of a against b restricted to a Sakoe-Chiba band
+
+    Row i of a may only match b[i + center - radius : i + center + radius + 1].
+    Rows whose band would leave b are dropped, and the path may start and end
+    anywhere in the band of the first and last kept rows (open begin/end).
+
+    Costs are Euclidean distances computed a block of rows at a time with
+    one matrix product. Each row of the recursion is a prefix scan:
+    D[i, k] = S[k] + min_{k' <= k} (P[k'] - S[k' - 1]), where S is the
+    cumulative cost along the row and P the best predecessor in row i - 1,
+    so it runs with np.minimum.accumulate instead of a loop over cells.
+    Memory is one int8 move per band cell plus one block of costs.
+
+    Returns (rows, cols, total_cost) describing the warping path.
+    """
+    n, m = len(a), len(b)
+    width = 2 * radius + 1
+    first = max(0, radius - center)
+    last = min(n, m - center - radius)
+    if last - first < 1:
+        raise ValueError("The band does not fit inside the second sequence")
+
+    moves = np.empty((last - first, width), dtype=np.int8)
+    a_sq = (a ** 2).sum(axis=1)
+    b_sq = (b ** 2).sum(axis=1)
+    band = np.arange(width)
+    previous = None
+
+    for block_start in range(first, last, block):
+        rows = np.arange(block_start, min(block_start + block, last))
+        lo = rows[0] + center - radius
+        hi = rows[-1] + center + radius + 1
+        # One product for the block, then pick each row's band out of it
+        products = a[rows] @ b[lo:hi].T
+        local = np.arange(len(rows))[:, None] + band
+        sq = a_sq[rows][:, None] + b_sq[lo + local] - 2 * products[np.arange(len(rows))[:, None], local]
+        costs = np.sqrt(np.maximum(sq, 0))
+
+        for r, cost in enumerate(costs):
+            i = rows[r] - first
+            if previous is None:
+                previous = cost.copy()
+                moves[i] = DIAGONAL
+                continue
+            # Band index k in row i is the diagonal of k and the vertical of k + 1 in row i - 1
+            up = np.append(previous[1:], np.inf)
+            vertical = up < previous
+            best = np.where(vertical, up, previous)
+            cumulative = np.cumsum(cost)
+            candidates = best - (cumulative - cost)
+            running = np.minimum.accumulate(candidates)
+            previous = cumulative + running
+            moves[i] = np.where(running < candidates, HORIZONTAL, vertical.astype(np.int8))
+
+    # Backtrack from the cheapest end point
+    k = int(np.argmin(previous))
+    total = float(previous[k])
+    i = last - first - 1
+    path_rows, path_bands = [], []
+    while True:
+        path_rows.append(i)
+        path_bands.append(k)
+        move = moves[i, k]
+        if move == HORIZONTAL and k > 0:
+            k -= 1
+        elif i == 0:
+            break
+        elif move == VERTICAL:
+            i -= 1
+            k += 1
+        else:
+            i -= 1
+
+    path_rows = np.array(path_rows[::-1]) + first
+    path_cols = path_rows + center - radius + np.array(path_bands[::-1])
+    return path_rows, path_cols, total
+
+def dtw_frame_mapping(left_data, right_data, overlap_x_range=(290, 320), radius=200, lag=None,
+                      y_bins=8, block=1024):
+    """Frame-to-frame alignment of two cameras by banded DTW on overlap descriptors
+
+    The band is centred on the coarse cross-correlation lag (sync_estimator)
+    unless lag is given. Returns a dict with the warping path (left_frame,
+    right_frame arrays), mapping (one right frame per left frame, the mean
+    of the path's matches, rounded), the median offset and the path cost.
+    """
+    if lag is None:
+        lag = estimate_sync_offset(left_data, right_data, overlap_x_range)['offset']
+
+    y = np.concatenate([
+        np.asarray(left_data['pitch_y'])[overlap_rows(left_data, overlap_x_range)],
+        np.asarray(right_data['pitch_y'])[overlap_rows(right_data, overlap_x_range)]
+    ])
+    y_range = (float(y.min()), float(y.max()) + 1e-6)
+    left_start, left = frame_descriptors(left_data, overlap_x_range, y_range, y_bins)
+    right_start, right = frame_descriptors(right_data, overlap_x_range, y_range, y_bins)
+
+    # Band centre in index space: right index = left index + center
+    center = left_start + lag - right_start
+    rows, cols, cost = banded_dtw(left, right, center, radius, block)
+    left_frames = rows + left_start
+    right_frames = cols + right_start
+
+    frames, starts = np.unique(left_frames, return_index=True)
+    counts = np.diff(np.append(starts, len(left_frames)))
+    mapped = np.rint(np.add.reduceat(right_frames, starts) / counts).astype(np.int64)
+
+    return {
+        'left_frame': left_frames,
+        'right_frame': right_frames,
+        'mapping': pd.DataFrame({'left_frame': frames, 'right_frame': mapped}),
+        'offset': float(np.median(right_frames - left_frames)),
+        'cost': cost,
+        'lag': lag
+    }
+
+@timed()
+def calculate_dtw_offset(left_data, right_data, mode='banded', overlap_x_range=(290, 320), radius=200):
+    """Calculate time offset using Dynamic Time Warping.
+
+    mode='banded' aligns per-frame overlap descriptors (dtw_frame_mapping) and
+    returns the median frame offset (right frame = left frame + offset).
+    mode='fastdtw' is the original alignment of raw (pitch_x, pitch_y) rows,
+    returning the median row-index difference.
+    """
+    if mode == 'banded':
+        return dtw_frame_mapping(left_data, right_data, overlap_x_range, radius)['offset']
+
+    from fastdtw import fastdtw
+    from scipy.spatial.distance import euclidean
+
     left_features = extract_features(left_data)
     right_features = extract_features(right_data)
-    
+
     distance, path = fastdtw(left_features, right_features, dist=euclidean)
     offsets = [p[0] - p[1] for p in path]
     return np.median(offsets)
 
 if __name__ == "__main__":
-    left_data = pd.read_csv("path/to/camL_1.csv")
-    right_data = pd.read_csv("path/to/camR_1.csv")
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    left_data = load_tracks(os.path.join(data_dir, "camL_1.csv"))
+    right_data = load_tracks(os.path.join(data_dir, "camR_1.csv"))
 
     # Calculate DTW offset
-    dtw_offset = calculate_dtw_offset(left_data, right_data)
-    print(f"DTW Offset: {dtw_offset} frames")
+    result = dtw_frame_mapping(left_data, right_data, overlap_x_range=(463, 619))
+    print(f"Coarse lag: {result['lag']} frames")
+    print(f"DTW Offset: {result['offset']} frames (path length {len(result['left_frame'])})")
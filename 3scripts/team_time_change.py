@@ -1,6 +1,11 @@
 import pandas as pd
 import plotly.graph_objects as go
 import os
+import sys
+
+# Track store and time alignment live in scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+from track_store import as_store
 
 def load_data(file_path):
     """Load CSV data."""
@@ -36,10 +41,8 @@ def plot_tracks(left_data, right_data, z_offset=0):
         )
 
     # Plot right camera data with offset
-    for track_id in right_data['tracking_id'].unique():
-        track = right_data[right_data['tracking_id'] == track_id].copy()
-        track['frame'] = track['frame'] - z_offset  # Apply the offset
-        team_id = track['team_id'].iloc[0]  # Assuming 'team_id' column exists
+    for track_id, track in as_store(right_data).aligned(z_offset).tracks():
+        team_id = track['team_id'][0]  # Assuming 'team_id' column exists
         color = team_colors.get(team_id, 'gray')  # Default to gray if team not found
         fig.add_trace(
             go.Scatter3d(
@@ -1,13 +1,15 @@
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import pandas as pd
 import numpy as np
 import os
 import glob
+from track_cache import load_tracks
+from track_quality import filter_tracks
+from trace_render import packed_trace
 
 def analyze_tracking_file(file_path, team_colors):
     """Comprehensive analysis of a single tracking file"""
-    data = pd.read_csv(file_path)
+    data = load_tracks(file_path)
     file_name = os.path.basename(file_path)
     
     # Calculate key statistics for title
@@ -32,30 +34,7 @@ def analyze_tracking_file(file_path, team_colors):
     )
     
     # Quality filtering (from team_3d_visualization.py)
-    VELOCITY_THRESHOLD = 50
-    MIN_TRACK_LENGTH = 30
-    MAX_POSITION_JUMP = 50
-    
-    valid_track_ids = []
-    for track_id in data['tracking_id'].unique():
-        track = data[data['tracking_id'] == track_id]
-        track_length = len(track)
-        max_velocity = track['velocity'].max() if 'velocity' in data.columns else 0
-        x_jumps = abs(track['pitch_x'].diff()).max()
-        y_jumps = abs(track['pitch_y'].diff()).max()
-        has_duplicates = track.groupby('frame').size().max() > 1
-        
-        is_valid = (
-            track_length >= MIN_TRACK_LENGTH and
-            max_velocity <= VELOCITY_THRESHOLD and
-            x_jumps <= MAX_POSITION_JUMP and
-            y_jumps <= MAX_POSITION_JUMP and
-            not has_duplicates
-        )
-        if is_valid:
-            valid_track_ids.append(track_id)
-    
-    filtered_data = data[data['tracking_id'].isin(valid_track_ids)]
+    filtered_data = filter_tracks(data, check_duplicates=True)
     
     # Create main figure with subplots
     fig = make_subplots(
@@ -68,25 +47,13 @@ def analyze_tracking_file(file_path, team_colors):
         column_widths=[0.7, 0.3]
     )
     
-    # Add 3D trajectories
-    for team_id in filtered_data['team_id'].unique():
+    # Add 3D trajectories, all players of a team packed into one trace
+    for team_id in sorted(filtered_data['team_id'].unique()):
         team_data = filtered_data[filtered_data['team_id'] == team_id]
-        for player_id in team_data['tracking_id'].unique():
-            player_data = team_data[team_data['tracking_id'] == player_id].copy()
-            player_data = player_data.iloc[::3]  # Downsample for performance
-            
-            fig.add_trace(
-                go.Scatter3d(
-                    x=player_data['pitch_x'],
-                    y=player_data['pitch_y'],
-                    z=player_data['frame'],
-                    mode='lines',
-                    name=f"Player {player_id} (Team {team_id})",
-                    line=dict(color=team_colors[team_id], width=2),
-                    opacity=0.6
-                ),
-                row=1, col=1
-            )
+        fig.add_trace(
+            packed_trace(team_data, f"Team {team_id}", color=team_colors[team_id]),
+            row=1, col=1
+        )
     
     # Add histograms
     track_lengths = filtered_data.groupby('tracking_id').size()
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import os
+from track_store import as_store
 
 def analyze_and_visualize(left_data, right_data, z_offset=1885):
     """Analyze X ranges and visualize with adjustable Z offset"""
@@ -23,8 +24,7 @@ def analyze_and_visualize(left_data, right_data, z_offset=1885):
     fig = go.Figure()
     
     # Plot left camera tracks
-    for track_id in left_sprint['tracking_id'].unique():
-        track = left_sprint[left_sprint['tracking_id'] == track_id]
+    for track_id, track in as_store(left_sprint).tracks():
         fig.add_trace(
             go.Scatter3d(
                 x=track['pitch_x'],
@@ -38,8 +38,7 @@ def analyze_and_visualize(left_data, right_data, z_offset=1885):
         )
     
     # Plot right camera tracks with z_offset
-    for track_id in right_sprint['tracking_id'].unique():
-        track = right_sprint[right_sprint['tracking_id'] == track_id].copy()
+    for track_id, track in as_store(right_sprint).tracks():
         # Apply the Z offset
         track['frame'] = track['frame'] - z_offset
         fig.add_trace(
@@ -0,0 +1,218 @@
+import numpy as np
+import json
+import os
+import re
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from joint_sync import CAMERA_ORDER, joint_sync, neighbour_pairs
+from overlap_region import detect_overlaps
+from stitch_writer import write_stitched
+from track_cache import CACHE_DIR_NAME, load_tracks
+from track_quality import track_quality
+
+CAMERA_FILE = re.compile(r'^cam([A-Z])_(.+)\.csv$')
+STATE_FILE = 'state.json'
+LOG_FILE = 'batch_log.jsonl'
+
+
+def discover_matches(root, order=CAMERA_ORDER):
+    """Every match under root with a full set of camX_<match>.csv files
+
+    Returns a sorted list of {'match': id, 'paths': {camera: path}}; the id
+    is the directory relative to root plus the match suffix. Incomplete sets
+    are skipped.
+    """
+    matches = []
+    for directory, subdirs, files in os.walk(root):
+        subdirs[:] = sorted(d for d in subdirs if d != CACHE_DIR_NAME and not d.startswith('.'))
+        found = {}
+        for name in files:
+            m = CAMERA_FILE.match(name)
+            if m:
+                found.setdefault(m.group(2), {})[m.group(1)] = os.path.join(directory, name)
+        for suffix, paths in sorted(found.items()):
+            if all(camera in paths for camera in order):
+                relative = os.path.relpath(directory, root)
+                matches.append({
+                    'match': suffix if relative == '.' else f"{relative.replace(os.sep, '/')}/{suffix}",
+                    'paths': {camera: paths[camera] for camera in order}
+                })
+    return matches
+
+
+def _stamps(paths):
+    return {name: [os.stat(path).st_mtime_ns, os.stat(path).st_size] for name, path in paths.items()}
+
+
+def _load_state(state_path, paths):
+    """Finished stages of an earlier run, unless a source file changed since"""
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {'stamps': _stamps(paths), 'stages': {}}
+    if state.get('stamps') != _stamps(paths):
+        return {'stamps': _stamps(paths), 'stages': {}}
+    return state
+
+
+def _save_state(state_path, state):
+    tmp = state_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, state_path)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_match(task):
+    """load -> quality filter -> sync -> stitch for one match, with checkpoints
+
+    Each finished stage is recorded in <out_dir>/state.json (quality keeps
+    its valid track ids in quality.npz), so a rerun resumes after the last
+    finished stage. Returns a log dict with per-stage seconds and the peak
+    RSS of the worker.
+    """
+    match, paths, out_dir, options = task['match'], task['paths'], task['out_dir'], task['options']
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = os.path.join(out_dir, STATE_FILE)
+    state = _load_state(state_path, paths)
+    stages = state['stages']
+    log = {'match': match, 'status': 'ok', 'stages': {}, 'resumed': sorted(stages)}
+    started = time.perf_counter()
+    names = list(paths)
+
+    try:
+        # Loading always runs: later stages need the (memory-mapped) columns
+        start = time.perf_counter()
+        cameras = {name: load_tracks(path) for name, path in paths.items()}
+        stages['load'] = {'rows': {name: len(data) for name, data in cameras.items()}}
+        log['stages']['load'] = time.perf_counter() - start
+
+        quality_path = os.path.join(out_dir, 'quality.npz')
+        if 'quality' not in stages or not os.path.exists(quality_path):
+            start = time.perf_counter()
+            valid = {}
+            for name, data in cameras.items():
+                quality = track_quality(data, check_duplicates=False, **options.get('quality', {}))
+                valid[name] = np.asarray(quality.index[quality['valid']])
+            np.savez(quality_path, **valid)
+            stages['quality'] = {'valid_tracks': {name: len(ids) for name, ids in valid.items()}}
+            stages.pop('sync', None)
+            stages.pop('stitch', None)
+            _save_state(state_path, state)
+            log['stages']['quality'] = time.perf_counter() - start
+        with np.load(quality_path) as stored:
+            valid = {name: stored[name] for name in names}
+        cameras = {name: data[np.isin(np.asarray(data['tracking_id']), valid[name])]
+                   for name, data in cameras.items()}
+
+        if 'sync' not in stages:
+            start = time.perf_counter()
+            regions = detect_overlaps(paths, neighbour_pairs(names))
+            offsets, pairwise, loops = joint_sync(cameras, names, lag_window=options.get('lag_window'),
+                                                  max_workers=1, regions=regions)
+            stages['sync'] = {
+                'offsets': offsets,
+                'pairs': [[a, b, list(regions[a, b]['x_range'])] for a, b in neighbour_pairs(names, reach=1)
+                          if regions.get((a, b))],
+                'max_residual': float(pairwise['residual'].abs().max()) if len(pairwise) else None,
+                'max_closure': float(loops['closure'].abs().max()) if len(loops) else None
+            }
+            stages.pop('stitch', None)
+            _save_state(state_path, state)
+            log['stages']['sync'] = time.perf_counter() - start
+        del cameras
+
+        if 'stitch' not in stages:
+            start = time.perf_counter()
+            sync = stages['sync']
+            meta = write_stitched(paths, sync['offsets'], [(a, b, tuple(band)) for a, b, band in sync['pairs']],
+                                  os.path.join(out_dir, 'stitched'), tuple(options.get('formats', ('bin', 'csv'))),
+                                  tracks=valid)
+            stages['stitch'] = {'rows': meta['rows'], 'global_ids': meta['global_ids']}
+            _save_state(state_path, state)
+            log['stages']['stitch'] = time.perf_counter() - start
+    except Exception as e:
+        log['status'] = 'failed'
+        log['error'] = f"{type(e).__name__}: {e}"
+
+    log['offsets'] = stages.get('sync', {}).get('offsets')
+    log['seconds'] = time.perf_counter() - started
+    log['peak_rss_mb'] = _peak_rss_mb()
+    return log
+
+
+def run_batch(root, out_root, workers=None, force=False, options=None):
+    """Run every discovered match in a process pool, one match per task
+
+    options: formats for the stitched files, lag_window for the sync and
+    quality thresholds passed to track_quality. Each worker process handles
+    a single match (so its peak RSS is that match's), and finished matches
+    are skipped unless force is set. One JSON line per match is appended to
+    <out_root>/batch_log.jsonl.
+
+    Returns the list of log dicts of this run.
+    """
+    options = options or {}
+    tasks = []
+    for match in discover_matches(root):
+        out_dir = os.path.join(out_root, match['match'])
+        if force:
+            state_path = os.path.join(out_dir, STATE_FILE)
+            if os.path.exists(state_path):
+                os.remove(state_path)
+        elif 'stitch' in _load_state(os.path.join(out_dir, STATE_FILE), match['paths'])['stages']:
+            print(f"{match['match']}: already done")
+            continue
+        tasks.append(dict(match, out_dir=out_dir, options=options))
+
+    os.makedirs(out_root, exist_ok=True)
+    logs = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), max_tasks_per_child=1) as pool, \
+            open(os.path.join(out_root, LOG_FILE), 'a') as log_file:
+        futures = [pool.submit(run_match, task) for task in tasks]
+        for future in as_completed(futures):
+            log = future.result()
+            log['finished'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            log_file.write(json.dumps(log) + '\n')
+            log_file.flush()
+            logs.append(log)
+
+            stages = ', '.join(f"{stage} {seconds:.1f} s" for stage, seconds in log['stages'].items())
+            status = log['error'] if log['status'] == 'failed' else f"offsets {log['offsets']}"
+            print(f"{log['match']}: {log['seconds']:.1f} s ({stages}), "
+                  f"peak {log['peak_rss_mb']:.0f} MB, {status}")
+    return logs
+
+
+if __name__ == "__main__":
+    import argparse
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Sync and stitch every match in a directory tree")
+    parser.add_argument('root', nargs='?', default=os.path.join(os.path.dirname(current_dir), 'data'),
+                        help="directory searched for camL_N/camM_N/camR_N CSV triplets")
+    parser.add_argument('--out', help="output directory (default: <root>/stitched)")
+    parser.add_argument('--workers', type=int, help="processes (default: all cores)")
+    parser.add_argument('--force', action='store_true', help="ignore checkpoints and redo every match")
+    parser.add_argument('--lag-window', help="'LO,HI' frames to search for pairwise lags")
+    parser.add_argument('--format', default='bin,csv', help="comma separated: bin, csv")
+    parser.add_argument('--max-position-jump', type=float, help="quality filter threshold (pitch units)")
+    args = parser.parse_args()
+
+    options = {'formats': args.format.split(',')}
+    if args.lag_window:
+        options['lag_window'] = tuple(int(v) for v in args.lag_window.split(','))
+    if args.max_position_jump is not None:
+        options['quality'] = {'max_position_jump': args.max_position_jump}
+
+    start = time.perf_counter()
+    logs = run_batch(args.root, args.out or os.path.join(args.root, 'stitched'), args.workers, args.force, options)
+    failed = [log['match'] for log in logs if log['status'] == 'failed']
+    print(f"\n{len(logs)} matches in {time.perf_counter() - start:.1f} s"
+          + (f", failed: {', '.join(failed)}" if failed else ""))
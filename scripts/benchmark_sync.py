@@ -0,0 +1,266 @@
+import numpy as np
+import pandas as pd
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from importlib.machinery import SourceFileLoader
+from drift_sync import PiecewiseOffset
+from live_sync import FPS
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(current_dir)
+
+# Data sizes in minutes, from a short clip to a full match
+SIZES = (1, 5, 15, 45, 90)
+
+# Perturbations applied to the synthetic right camera
+SCENARIOS = {
+    'clean': {},
+    'noise': {'noise': 1.5},
+    'id_switches': {'id_switch_rate': 0.5},
+    'dropped_frames': {'drop_rate': 0.05},
+    'drift': {'drift': 1 / 2000},
+    'all': {'noise': 1.5, 'id_switch_rate': 0.5, 'drop_rate': 0.05, 'drift': 1 / 2000},
+}
+
+
+def make_pair(world, offset=1885, drift=0.0, noise=0.0, id_switch_rate=0.0, drop_rate=0.0,
+              overlap_x_range=(463, 619), seed=0):
+    """Split one real camera's tracks into a synthetic left/right pair
+
+    Left keeps the rows with pitch_x <= overlap end, right the rows with
+    pitch_x >= overlap start, so the overlap band is seen by both. The right
+    camera then gets frame = f + truth(f) with truth = offset + drift * (f - f0),
+    Gaussian position noise, ID switches (on average id_switch_rate per
+    track, at a random frame) and a fraction drop_rate of frames removed.
+
+    Returns (left, right, truth) with truth a PiecewiseOffset in the
+    match_overlap convention.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.asarray(world['pitch_x'])
+    frame = np.asarray(world['frame']).astype(np.int64)
+    f0, f1 = int(frame.min()), int(frame.max())
+    truth = PiecewiseOffset([f0, max(f1, f0 + 1)], [offset, offset + drift * (max(f1, f0 + 1) - f0)])
+
+    left = world[x <= overlap_x_range[1]].reset_index(drop=True)
+    right = world[x >= overlap_x_range[0]].reset_index(drop=True)
+
+    columns = {c: np.asarray(right[c]).copy() for c in right.columns}
+    columns['frame'] = (columns['frame'] + np.rint(truth(columns['frame']))).astype(np.int64)
+    if noise:
+        columns['pitch_x'] = columns['pitch_x'] + rng.normal(0, noise, len(right)).astype(columns['pitch_x'].dtype)
+        columns['pitch_y'] = columns['pitch_y'] + rng.normal(0, noise, len(right)).astype(columns['pitch_y'].dtype)
+
+    # Right-camera ids are distinct from the left camera's
+    ids = columns['tracking_id'].astype(np.int64) + 100000
+    if id_switch_rate:
+        track_ids, inverse = np.unique(ids, return_inverse=True)
+        switched = rng.random(len(track_ids)) < id_switch_rate
+        first = np.full(len(track_ids), np.iinfo(np.int64).max)
+        last = np.full(len(track_ids), np.iinfo(np.int64).min)
+        np.minimum.at(first, inverse, columns['frame'])
+        np.maximum.at(last, inverse, columns['frame'])
+        cut = first + (rng.random(len(track_ids)) * (last - first + 1)).astype(np.int64)
+        after = switched[inverse] & (columns['frame'] >= cut[inverse])
+        ids = np.where(after, ids + 100000, ids)
+    columns['tracking_id'] = ids
+
+    right = pd.DataFrame(columns)
+    if drop_rate:
+        frames = np.unique(columns['frame'])
+        dropped = frames[rng.random(len(frames)) < drop_rate]
+        right = right[~np.isin(columns['frame'], dropped)].reset_index(drop=True)
+
+    return left, right, truth
+
+
+def _load_script(name, path):
+    """Import a script that is not on the path or has no .py extension"""
+    if not os.path.exists(path):
+        raise ImportError(f"{path} not found")
+    loader = SourceFileLoader(name, path)
+    spec = importlib.util.spec_from_loader(name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+# Adapters: (left, right, overlap_x_range) -> offset in the match_overlap
+# convention (right frame = left frame + offset) or a frame -> offset callable.
+# Imports happen on first call so a missing dependency only skips that estimator.
+
+def _find_sync_offset(left, right, overlap_x_range):
+    from find_sync_offset import find_sync_offset
+    # Count cross-correlation lag, reported as left index - right index
+    return -int(find_sync_offset(left, right, overlap_x_range))
+
+
+def _sync_a1(left, right, overlap_x_range):
+    module = _load_script('sync_a1', os.path.join(repo_dir, '3scripts', 'sync-a1'))
+    return -int(module.find_best_z_offset(left, right, overlap_x_range))
+
+
+def _match_overlap(left, right, overlap_x_range):
+    from match_overlap import find_best_z_offset
+    return find_best_z_offset(left, right, overlap_x_range)
+
+
+def _match_overlap_v2(left, right, overlap_x_range):
+    from match_overlap_v2 import find_best_z_offset
+    return find_best_z_offset(left, right, overlap_x_range)
+
+
+def _match_overlap_v3(left, right, overlap_x_range):
+    from match_overlap_v3 import find_best_z_offset
+    return find_best_z_offset(left, right, overlap_x_range)
+
+
+def _calculate_dtw_offset(left, right, overlap_x_range):
+    module = _load_script('dtw_alignment', os.path.join(repo_dir, '3scripts', 'dtw_alignment.py'))
+    # Banded DTW on per-frame overlap descriptors, median frame offset of the path
+    return module.calculate_dtw_offset(left, right, overlap_x_range=overlap_x_range)
+
+
+def _estimate_sync_offset(left, right, overlap_x_range):
+    from sync_estimator import estimate_sync_offset
+    return estimate_sync_offset(left, right, overlap_x_range)['offset']
+
+
+def _estimate_drifting_offset(left, right, overlap_x_range):
+    from drift_sync import estimate_drifting_offset
+    return estimate_drifting_offset(left, right, overlap_x_range, max_workers=1)[0]
+
+
+# Name -> adapter
+ESTIMATORS = {
+    'find_sync_offset': _find_sync_offset,
+    'sync-a1': _sync_a1,
+    'match_overlap': _match_overlap,
+    'match_overlap_v2': _match_overlap_v2,
+    'match_overlap_v3': _match_overlap_v3,
+    'calculate_dtw_offset': _calculate_dtw_offset,
+    'estimate_sync_offset': _estimate_sync_offset,
+    'estimate_drifting_offset': _estimate_drifting_offset,
+}
+
+
+def offset_error(estimate, truth, frames):
+    """Mean absolute error in frames over the given left frames"""
+    frames = np.asarray(frames, dtype=np.float64)
+    expected = truth(frames)
+    predicted = estimate(frames) if callable(estimate) else np.full(len(frames), float(estimate))
+    return float(np.mean(np.abs(predicted - expected)))
+
+
+def run_one(function, left, right, overlap_x_range, truth):
+    """Wall time, peak traced memory and error of one estimator call"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            estimate = function(left, right, overlap_x_range)
+        error = None
+    except ImportError as e:
+        tracemalloc.stop()
+        return {'skipped': str(e)}
+    except Exception as e:
+        estimate, error = None, f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {'seconds': seconds, 'peak_mb': peak / 2 ** 20, 'error': error}
+    if estimate is not None:
+        frames = np.unique(np.asarray(left['frame']))
+        result['estimate'] = repr(estimate) if callable(estimate) else float(estimate)
+        result['abs_error'] = offset_error(estimate, truth, frames)
+    return result
+
+
+def run_benchmark(world, sizes=SIZES, scenarios=SCENARIOS, overlap_x_range=(463, 619), offset=1885,
+                  fps=FPS, only=None, seed=0):
+    """Every estimator on every (size, scenario); returns a list of result dicts
+
+    Sizes longer than the source recording are run once on the whole file.
+    """
+    frame = np.asarray(world['frame'])
+    first = int(frame.min())
+    total = int(frame.max()) - first + 1
+    results = []
+
+    previous = None
+    for minutes in sizes:
+        n_frames = min(int(minutes * 60 * fps), total)
+        if n_frames == previous:
+            break
+        previous = n_frames
+        clip = world[frame < first + n_frames]
+
+        for scenario, params in scenarios.items():
+            left, right, truth = make_pair(clip, offset, overlap_x_range=overlap_x_range, seed=seed, **params)
+            for name, function in ESTIMATORS.items():
+                if only and name not in only:
+                    continue
+                row = {'estimator': name, 'minutes': minutes, 'frames': n_frames, 'scenario': scenario,
+                       'left_rows': len(left), 'right_rows': len(right)}
+                row.update(run_one(function, left, right, overlap_x_range, truth))
+                results.append(row)
+
+                if 'skipped' in row or row['error']:
+                    status = row.get('skipped') or row['error']
+                else:
+                    status = f"{row['seconds']:.2f} s, {row['peak_mb']:.0f} MB, error {row['abs_error']:.1f}"
+                print(f"{minutes:>4} min  {scenario:<15} {name:<25} {status}")
+    return results
+
+
+def write_report(results, path, config):
+    """JSON report with the environment, the configuration and every result"""
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'config': config,
+        'results': results
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    from track_cache import load_tracks
+
+    parser = argparse.ArgumentParser(description="Benchmark the sync estimators on synthetic offsets")
+    parser.add_argument('--source', default=os.path.join(repo_dir, 'data', 'camL_1.csv'),
+                        help="real camera CSV the synthetic pair is cut from")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in SIZES), help="minutes, comma separated")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="comma separated")
+    parser.add_argument('--only', help="comma separated estimator names")
+    parser.add_argument('--offset', type=int, default=1885)
+    parser.add_argument('--output', default=os.path.join(repo_dir, 'data', 'sync_benchmark.json'))
+    args = parser.parse_args()
+
+    world = load_tracks(args.source)
+    config = {
+        'source': os.path.abspath(args.source),
+        'sizes': [float(s) for s in args.sizes.split(',')],
+        'scenarios': {name: SCENARIOS[name] for name in args.scenarios.split(',')},
+        'offset': args.offset,
+        'overlap_x_range': [463, 619],
+        'fps': FPS
+    }
+    results = run_benchmark(world, config['sizes'], config['scenarios'], tuple(config['overlap_x_range']),
+                            args.offset, only=args.only.split(',') if args.only else None)
+    write_report(results, args.output, config)
+    print(f"\nReport written to {args.output}")
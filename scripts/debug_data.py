@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 import os
+from track_store import as_store
 
 def analyze_overlap_data(left_data, right_data, overlap_x_range=(250, 350)):
     """Analyze data in the overlap region"""
@@ -41,15 +42,13 @@ def analyze_overlap_data(left_data, right_data, overlap_x_range=(250, 350)):
     
     # Analyze track patterns
     print("\nTrack patterns in overlap region:")
-    for track_id in left_overlap['tracking_id'].unique():
-        track = left_overlap[left_overlap['tracking_id'] == track_id]
+    for track_id, track in as_store(left_overlap).tracks():
         print(f"\nLeft Track {track_id}:")
         print(f"Frames: {track['frame'].min()} - {track['frame'].max()}")
         print(f"X range: {track['pitch_x'].min():.1f} - {track['pitch_x'].max():.1f}")
         print(f"Y range: {track['pitch_y'].min():.1f} - {track['pitch_y'].max():.1f}")
     
-    for track_id in right_overlap['tracking_id'].unique():
-        track = right_overlap[right_overlap['tracking_id'] == track_id]
+    for track_id, track in as_store(right_overlap).tracks():
         print(f"\nRight Track {track_id}:")
         print(f"Frames: {track['frame'].min()} - {track['frame'].max()}")
         print(f"X range: {track['pitch_x'].min():.1f} - {track['pitch_x'].max():.1f}")
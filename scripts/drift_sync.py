@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+import os
+from concurrent.futures import ProcessPoolExecutor
+from sync_estimator import (
+    overlap_rows, overlap_signals, correlate_signals, peak_sharpness,
+    estimate_sync_offset, standardize, channel_layout
+)
+from track_cache import load_tracks
+from instrument import timed
+
+
+class PiecewiseOffset:
+    """Frame -> offset mapping made of linear segments between knots
+
+    Calling the model with left-camera frames returns the offset to apply to
+    the right camera at those frames (right frame = left frame + offset).
+    Outside the knots the first/last segment is extrapolated.
+    """
+
+    def __init__(self, knot_frames, knot_offsets):
+        self.knot_frames = np.asarray(knot_frames, dtype=np.float64)
+        self.knot_offsets = np.asarray(knot_offsets, dtype=np.float64)
+
+    def __call__(self, frames):
+        frames = np.asarray(frames, dtype=np.float64)
+        kf, ko = self.knot_frames, self.knot_offsets
+        if len(kf) == 1:
+            return np.full(frames.shape, ko[0])
+        offsets = np.interp(frames, kf, ko)
+        # Linear extrapolation beyond the first and last knots
+        before = frames < kf[0]
+        after = frames > kf[-1]
+        offsets[before] = ko[0] + (frames[before] - kf[0]) * (ko[1] - ko[0]) / (kf[1] - kf[0])
+        offsets[after] = ko[-1] + (frames[after] - kf[-1]) * (ko[-1] - ko[-2]) / (kf[-1] - kf[-2])
+        return offsets
+
+    def __repr__(self):
+        knots = ', '.join(f"{f:.0f}:{o:.2f}" for f, o in zip(self.knot_frames, self.knot_offsets))
+        return f"PiecewiseOffset({knots})"
+
+
+def align_frames(frames, offset):
+    """Map right-camera frames onto the left camera's clock
+
+    offset is a constant or a frame -> offset callable such as PiecewiseOffset
+    (evaluated on left frames, so it is inverted with two fixed-point steps).
+    Fractional results are rounded to the nearest frame in both cases and
+    the input dtype is kept.
+    """
+    frames = np.asarray(frames)
+    if not callable(offset):
+        if float(offset).is_integer():
+            return (frames - int(offset)).astype(frames.dtype)
+        return np.rint(frames - offset).astype(frames.dtype)
+    left = frames - offset(frames)
+    left = frames - offset(left)
+    return np.rint(left).astype(frames.dtype)
+
+
+# Signals shared with the worker processes, set once per worker by _init_worker
+_shared = {}
+
+
+def _init_worker(left_signals, left_start, right_signals, right_start):
+    _shared['left'] = (left_signals, left_start)
+    _shared['right'] = (right_signals, right_start)
+
+
+def _window_offset(task):
+    """Estimate the lag for one window of the left camera"""
+    window_start, window_length, lag_lo, lag_hi = task
+    left_signals, left_start = _shared['left']
+    right_signals, right_start = _shared['right']
+
+    # Left window and the slice of the right camera it can possibly match
+    l0 = window_start - left_start
+    left = left_signals[:, l0:l0 + window_length]
+    r0 = max(window_start + lag_lo - right_start, 0)
+    r1 = min(window_start + window_length + lag_hi - right_start, right_signals.shape[1])
+    if left.shape[1] == 0 or r1 - r0 <= 0:
+        return None
+    right = right_signals[:, r0:r1]
+    if not left.any() or not right.any():
+        return None
+
+    left = standardize(left)
+    right = standardize(right)
+    shifts, correlation = correlate_signals(left, right)
+    lags = shifts + (right_start + r0) - window_start
+    keep = (lags >= lag_lo) & (lags <= lag_hi)
+    if not keep.any():
+        return None
+    lags = lags[keep]
+    correlation = correlation[keep]
+    peak = int(np.argmax(correlation))
+
+    return (
+        window_start + window_length / 2,
+        int(lags[peak]),
+        peak_sharpness(correlation, peak),
+    )
+
+
+def windowed_offsets(left_data, right_data, overlap_x_range=(290, 320), window=6000, hop=3000,
+                     search=300, initial_offset=None, y_bins=8, max_workers=None):
+    """Estimate the lag over overlapping windows along the whole match
+
+    Overlap signals are computed once for each camera and shared with a
+    process pool; each window then only correlates slices of them, searching
+    +/- search frames around initial_offset (a whole-match estimate by default).
+
+    Returns a DataFrame with one row per window: center_frame, offset, confidence.
+    """
+    if initial_offset is None:
+        initial_offset = estimate_sync_offset(left_data, right_data, overlap_x_range, y_bins=y_bins)['offset']
+
+    left_mask = overlap_rows(left_data, overlap_x_range)
+    right_mask = overlap_rows(right_data, overlap_x_range)
+    y_range, teams = channel_layout(left_data, right_data, left_mask, right_mask)
+
+    left_frames = np.asarray(left_data['frame'])
+    right_frames = np.asarray(right_data['frame'])
+    left_start, left_end = int(left_frames.min()), int(left_frames.max()) + 1
+    right_start, right_end = int(right_frames.min()), int(right_frames.max()) + 1
+    left_signals = overlap_signals(left_data, left_start, left_end - left_start,
+                                   overlap_x_range, y_range, y_bins, teams)
+    right_signals = overlap_signals(right_data, right_start, right_end - right_start,
+                                    overlap_x_range, y_range, y_bins, teams)
+
+    lag_lo = initial_offset - search
+    lag_hi = initial_offset + search
+    tasks = [
+        (start, window, lag_lo, lag_hi)
+        for start in range(left_start, max(left_end - window, left_start) + 1, hop)
+    ]
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(left_signals, left_start, right_signals, right_start)
+    ) as pool:
+        results = [r for r in pool.map(_window_offset, tasks, chunksize=max(1, len(tasks) // 64)) if r]
+
+    return pd.DataFrame(results, columns=['center_frame', 'offset', 'confidence'])
+
+
+def fit_offset_model(windows, segment_frames=20000, min_confidence=3.0,
+                     outlier_threshold=3.5, max_iterations=10, smoothness=1e-3):
+    """Fit a robust piecewise-linear (clock drift) model to windowed offsets
+
+    Knots are spaced every segment_frames frames. The fit is a confidence
+    weighted least squares on a linear-interpolation basis; windows whose
+    residual exceeds outlier_threshold robust standard deviations (MAD based)
+    are dropped and the fit repeated until the inlier set stops changing.
+    A small penalty on the knots' second differences (weighted by
+    smoothness) carries the line across knots no window supports, e.g. a
+    gap in the overlap, instead of leaving them at zero.
+
+    Returns (PiecewiseOffset, inlier_mask) with the mask aligned to windows.
+    """
+    frames = windows['center_frame'].to_numpy(dtype=np.float64)
+    offsets = windows['offset'].to_numpy(dtype=np.float64)
+    weights = windows['confidence'].to_numpy(dtype=np.float64)
+
+    inliers = weights >= min_confidence
+    if inliers.sum() == 0:
+        raise ValueError("No windows with enough confidence to fit an offset model")
+
+    span = frames[inliers].max() - frames[inliers].min()
+    n_knots = int(min(max(2, np.ceil(span / segment_frames) + 1), max(inliers.sum() // 2, 1)))
+    if n_knots < 2:
+        return PiecewiseOffset([frames[inliers].mean()], [np.median(offsets[inliers])]), inliers
+    knot_frames = np.linspace(frames[inliers].min(), frames[inliers].max(), n_knots)
+
+    # Linear-interpolation (hat function) basis: offset(f) = basis(f) @ knot_offsets
+    basis = np.column_stack([np.interp(frames, knot_frames, np.eye(n_knots)[k]) for k in range(n_knots)])
+    # Second differences of the knot offsets (first differences with only two knots)
+    penalty = np.diff(np.eye(n_knots), n=min(2, n_knots - 1), axis=0)
+
+    for _ in range(max_iterations):
+        w = np.sqrt(weights[inliers])
+        lam = smoothness * np.sqrt(weights[inliers].sum())
+        design = np.vstack([basis[inliers] * w[:, None], lam * penalty])
+        target = np.concatenate([offsets[inliers] * w, np.zeros(len(penalty))])
+        knot_offsets, *_ = np.linalg.lstsq(design, target, rcond=None)
+        residuals = offsets - basis @ knot_offsets
+
+        mad = np.median(np.abs(residuals[inliers] - np.median(residuals[inliers])))
+        sigma = max(1.4826 * mad, 0.5)
+        new_inliers = (weights >= min_confidence) & (np.abs(residuals) <= outlier_threshold * sigma)
+        if np.array_equal(new_inliers, inliers) or new_inliers.sum() < n_knots:
+            break
+        inliers = new_inliers
+
+    return PiecewiseOffset(knot_frames, knot_offsets), inliers
+
+
+@timed()
+def estimate_drifting_offset(left_data, right_data, overlap_x_range=(290, 320), window=6000, hop=3000,
+                             search=300, segment_frames=20000, max_workers=None):
+    """Windowed sync followed by the robust drift fit; returns (model, windows)"""
+    windows = windowed_offsets(left_data, right_data, overlap_x_range, window, hop, search,
+                               max_workers=max_workers)
+    if windows.empty:
+        raise ValueError("No window produced an offset estimate")
+    model, inliers = fit_offset_model(windows, segment_frames)
+    windows['inlier'] = inliers
+    windows['fitted'] = model(windows['center_frame'])
+    return model, windows
+
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+
+    left_path = os.path.join(data_dir, 'camL_1.csv')
+    right_path = os.path.join(data_dir, 'camR_1.csv')
+
+    print("Loading data...")
+    left_data = load_tracks(left_path)
+    right_data = load_tracks(right_path)
+
+    print("Estimating windowed offsets...")
+    model, windows = estimate_drifting_offset(left_data, right_data)
+    print(windows.to_string(index=False))
+    print(f"\nOffset model: {model}")
@@ -2,6 +2,7 @@ import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
+from track_store import as_store
 
 def create_enhanced_view(left_data, right_data):
     # Create figure with subplots
@@ -17,9 +18,8 @@ def create_enhanced_view(left_data, right_data):
     right_frames = {}
     
     # Add 3D tracks
-    for track_id in left_data['tracking_id'].unique():
-        track = left_data[left_data['tracking_id'] == track_id]
-        left_frames[track_id] = track['frame'].values
+    for track_id, track in as_store(left_data).tracks():
+        left_frames[track_id] = track['frame']
         fig.add_trace(
             go.Scatter3d(
                 x=track['pitch_x'],
@@ -36,9 +36,8 @@ def create_enhanced_view(left_data, right_data):
     
     # Add right camera tracks
     initial_offset = 1885
-    for track_id in right_data['tracking_id'].unique():
-        track = right_data[right_data['tracking_id'] == track_id]
-        right_frames[track_id] = track['frame'].values
+    for track_id, track in as_store(right_data).tracks():
+        right_frames[track_id] = track['frame']
         fig.add_trace(
             go.Scatter3d(
                 x=track['pitch_x'],
@@ -4,11 +4,16 @@ from scipy.signal import correlate
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
+from track_cache import load_tracks
+from track_store import as_store
+from sync_estimator import estimate_sync_offset
+from instrument import timed
 
 # Get the absolute path to the data directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 data_dir = os.path.join(os.path.dirname(current_dir), 'data')
 
+@timed()
 def find_sync_offset(left_data, right_data, overlap_x_range=(290, 320)):
     """Find the frame offset that best aligns tracks in the overlap region"""
     
@@ -44,15 +49,18 @@ def find_sync_offset(left_data, right_data, overlap_x_range=(290, 320)):
     
     return offset
 
+@timed('figure.visualize_sync_comparison')
 def visualize_sync_comparison(left_data, right_data, offset):
     """Visualize tracks before and after synchronization"""
     fig = make_subplots(rows=1, cols=2, 
                        subplot_titles=('Before Sync', 'After Sync'),
                        specs=[[{'type': 'scene'}, {'type': 'scene'}]])
     
+    left_store = as_store(left_data)
+    right_store = as_store(right_data)
+    
     # Before sync
-    for track_id in left_data['tracking_id'].unique():
-        track = left_data[left_data['tracking_id'] == track_id]
+    for track_id, track in left_store.tracks():
         fig.add_trace(
             go.Scatter3d(x=track['pitch_x'], y=track['pitch_y'], z=track['frame'],
                         mode='lines', name=f'Left {track_id}',
@@ -60,8 +68,7 @@ def visualize_sync_comparison(left_data, right_data, offset):
             row=1, col=1
         )
     
-    for track_id in right_data['tracking_id'].unique():
-        track = right_data[right_data['tracking_id'] == track_id]
+    for track_id, track in right_store.tracks():
         fig.add_trace(
             go.Scatter3d(x=track['pitch_x'], y=track['pitch_y'], z=track['frame'],
                         mode='lines', name=f'Right {track_id}',
@@ -70,8 +77,7 @@ def visualize_sync_comparison(left_data, right_data, offset):
         )
     
     # After sync
-    for track_id in left_data['tracking_id'].unique():
-        track = left_data[left_data['tracking_id'] == track_id]
+    for track_id, track in left_store.tracks():
         fig.add_trace(
             go.Scatter3d(x=track['pitch_x'], y=track['pitch_y'], z=track['frame'],
                         mode='lines', name=f'Left {track_id}',
@@ -79,9 +85,7 @@ def visualize_sync_comparison(left_data, right_data, offset):
             row=1, col=2
         )
     
-    for track_id in right_data['tracking_id'].unique():
-        track = right_data[right_data['tracking_id'] == track_id].copy()
-        track['frame'] = track['frame'] - offset  # Apply sync offset
+    for track_id, track in right_store.aligned(offset).tracks():
         fig.add_trace(
             go.Scatter3d(x=track['pitch_x'], y=track['pitch_y'], z=track['frame'],
                         mode='lines', name=f'Right {track_id}',
@@ -102,8 +106,8 @@ if __name__ == "__main__":
     print(f"Right camera: {right_path}")
     
     # Load data for the specific sprint frames
-    left_data = pd.read_csv(left_path)
-    right_data = pd.read_csv(right_path)
+    left_data = load_tracks(left_path)
+    right_data = load_tracks(right_path)
     
     print(f"\nLeft data shape: {left_data.shape}")
     print(f"Right data shape: {right_data.shape}")
@@ -122,8 +126,11 @@ if __name__ == "__main__":
     print(f"Left sprint frames: {left_sprint['frame'].min()} - {left_sprint['frame'].max()}")
     print(f"Right sprint frames: {right_sprint['frame'].min()} - {right_sprint['frame'].max()}")
     
-    offset = find_sync_offset(left_sprint, right_sprint)
+    # Multi-channel FFT correlation over the whole match
+    result = estimate_sync_offset(left_data, right_data)
+    offset = result['offset']
     print(f"\nFound sync offset: {offset} frames")
+    print(f"Peak correlation: {result['peak_correlation']:.3f}, confidence: {result['confidence']:.1f}")
     
     fig = visualize_sync_comparison(left_sprint, right_sprint, offset)
     fig.show() 
\ No newline at end of file
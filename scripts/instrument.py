@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+import functools
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Recorder:
+    """Collects one record per timed stage while enabled
+
+    Records hold the stage name, its parent stage, wall and CPU seconds,
+    input/output row counts and, when memory tracing is on, the peak traced
+    memory during the stage (nested stages included). Disabled, timed
+    functions cost one attribute check. Stages nest per process and are
+    meant for single-threaded runs.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.records = []
+        self.stack = []
+        self.profiler = None
+        self.profile_path = None
+
+    def enable(self, trace_memory=True, profile=None, profile_path=None):
+        """Start recording; profile='cprofile' or 'pyinstrument' also captures a profile"""
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if profile == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif profile == 'pyinstrument':
+            from pyinstrument import Profiler
+            self.profiler = Profiler()
+            self.profiler.start()
+        elif profile is not None:
+            raise ValueError(f"Unknown profiler {profile!r}")
+        self.profile_path = profile_path
+
+    def disable(self):
+        """Stop recording and write the profile, if one was captured"""
+        if self.profiler is not None:
+            if hasattr(self.profiler, 'dump_stats'):
+                self.profiler.disable()
+                self.profiler.dump_stats(self.profile_path or 'instrument.prof')
+            else:
+                self.profiler.stop()
+                with open(self.profile_path or 'instrument.html', 'w') as f:
+                    f.write(self.profiler.output_html())
+            self.profiler = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.enabled = False
+
+    def reset(self):
+        self.records = []
+        self.stack = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """Time a block; the yielded record takes extra fields such as rows_out"""
+        if not self.enabled:
+            yield {}
+            return
+        record = {'stage': name, 'parent': self.stack[-1]['stage'] if self.stack else None,
+                  'depth': len(self.stack), 'rows_in': rows_in, 'rows_out': None}
+        if self.trace_memory:
+            # tracemalloc has one peak: fold it into the parent before resetting it
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1]['_peak'] = max(self.stack[-1]['_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_start_memory'] = current
+            record['_peak'] = current
+
+        self.stack.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - wall
+            record['cpu_seconds'] = time.process_time() - cpu
+            self.stack.pop()
+            if self.trace_memory:
+                peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1])
+                record['peak_mb'] = (peak - record.pop('_start_memory')) / 2 ** 20
+                if self.stack:
+                    self.stack[-1]['_peak'] = max(self.stack[-1]['_peak'], peak)
+            self.records.append(record)
+
+    def table(self):
+        """Summary per stage: calls, total/mean/max seconds, rows and peak memory"""
+        if not self.records:
+            return pd.DataFrame(columns=['calls', 'seconds', 'mean_seconds', 'max_seconds', 'rows_in', 'peak_mb'])
+        records = pd.DataFrame(self.records)
+        if 'peak_mb' not in records.columns:
+            records['peak_mb'] = np.nan
+        table = records.groupby('stage', sort=False).agg(
+            calls=('seconds', 'size'),
+            seconds=('seconds', 'sum'),
+            mean_seconds=('seconds', 'mean'),
+            max_seconds=('seconds', 'max'),
+            rows_in=('rows_in', 'max'),
+            peak_mb=('peak_mb', 'max')
+        )
+        table['rows_in'] = table['rows_in'].astype('Int64')
+        return table.sort_values('seconds', ascending=False)
+
+    def write_log(self, path, **meta):
+        """JSON log with the environment, every record and the summary"""
+        log = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'meta': meta,
+            'records': self.records,
+            'summary': json.loads(self.table().reset_index().to_json(orient='records'))
+        }
+        with open(path, 'w') as f:
+            json.dump(log, f, indent=2, default=str)
+        return log
+
+    def print_summary(self):
+        table = self.table()
+        if table.empty:
+            print("No stages recorded")
+            return
+        print(table.to_string(float_format=lambda v: f"{v:.3f}"))
+
+
+RECORDER = Recorder()
+stage = RECORDER.stage
+
+
+def _rows(value):
+    if isinstance(value, (pd.DataFrame, np.ndarray)):
+        return len(value)
+    return None
+
+
+def timed(name=None):
+    """Decorator recording every call as a stage
+
+    rows_in counts the rows of the DataFrame/array arguments, rows_out the
+    rows of the result when it is one.
+    """
+    def decorate(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not RECORDER.enabled:
+                return function(*args, **kwargs)
+            counts = [n for n in map(_rows, list(args) + list(kwargs.values())) if n is not None]
+            with RECORDER.stage(stage_name, sum(counts) if counts else None) as record:
+                result = function(*args, **kwargs)
+                record['rows_out'] = _rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+if __name__ == "__main__":
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser(description="Run a script with stage timing, memory and profiling")
+    parser.add_argument('script', help="path of the script to run (its own arguments follow)")
+    parser.add_argument('--log', default='instrument_log.json', help="JSON log path")
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], help="also capture a profile")
+    parser.add_argument('--profile-path', help="profile output (default: instrument.prof / instrument.html)")
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc (lower overhead)")
+    args, script_args = parser.parse_known_args()
+
+    # The script sees its own directory on the path and its own argv
+    script = os.path.abspath(args.script)
+    sys.path.insert(0, os.path.dirname(script))
+    sys.argv = [script] + script_args
+
+    # Use the importable module's recorder: the one the timed functions see
+    from instrument import RECORDER, stage
+
+    RECORDER.enable(trace_memory=not args.no_memory, profile=args.profile, profile_path=args.profile_path)
+    try:
+        with stage('total'):
+            runpy.run_path(script, run_name='__main__')
+    finally:
+        RECORDER.disable()
+        RECORDER.write_log(args.log, script=script, argv=script_args)
+        print(f"\nStage summary (log written to {args.log}):")
+        RECORDER.print_summary()
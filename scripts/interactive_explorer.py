@@ -1,42 +1,17 @@
-import pandas as pd
 import plotly.graph_objects as go
 import os
+from track_cache import load_tracks
+from trace_render import packed_trace
 
 def create_interactive_view(left_data, right_data):
     # Create figure
     fig = go.Figure()
     
-    # Plot all left camera tracks
-    for track_id in left_data['tracking_id'].unique():
-        track = left_data[left_data['tracking_id'] == track_id]
-        fig.add_trace(
-            go.Scatter3d(
-                x=track['pitch_x'],
-                y=track['pitch_y'],
-                z=track['frame'],
-                mode='lines',
-                name=f'Left {track_id}',
-                line=dict(color='blue'),
-                opacity=0.6,
-                visible=True
-            )
-        )
+    # Plot all left camera tracks as one trace
+    fig.add_trace(packed_trace(left_data, 'Left', color='blue', visible=True))
     
-    # Plot all right camera tracks
-    for track_id in right_data['tracking_id'].unique():
-        track = right_data[right_data['tracking_id'] == track_id]
-        fig.add_trace(
-            go.Scatter3d(
-                x=track['pitch_x'],
-                y=track['pitch_y'],
-                z=track['frame'],
-                mode='lines',
-                name=f'Right {track_id}',
-                line=dict(color='red'),
-                opacity=0.6,
-                visible=True
-            )
-        )
+    # Plot all right camera tracks as one trace
+    fig.add_trace(packed_trace(right_data, 'Right', color='red', visible=True))
     
     # Add range sliders for filtering
     fig.update_layout(
@@ -102,8 +77,8 @@ if __name__ == "__main__":
     right_path = os.path.join(data_dir, 'camR_1.csv')
     
     print("Loading data...")
-    left_data = pd.read_csv(left_path)
-    right_data = pd.read_csv(right_path)
+    left_data = load_tracks(left_path)
+    right_data = load_tracks(right_path)
     
     print("Creating interactive visualization...")
     fig = create_interactive_view(left_data, right_data)
@@ -1,95 +1,66 @@
-import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
+import webbrowser
+from track_cache import load_tracks
+from trace_render import packed_trace
+from offset_search import score_offsets
 
-def create_interactive_view(left_data, right_data):
+# Trace indexes used by the client-side slider script
+RIGHT_TRACE = 1
+
+def create_interactive_view(left_data, right_data, offsets=range(1800, 2000), overlap_x_range=(463, 619),
+                            initial_offset=None):
+    """Sprint comparison with an offset slider that only rewrites the right camera's z
+
+    The geometry of both cameras is sent once (one packed trace each, right
+    camera at the initial offset). Moving the slider subtracts the offset from the right
+    trace's z in the browser, so the HTML does not grow with the number of
+    offsets. The overlap error curve is drawn next to the 3D view.
+    """
     # Filter for sprint frames
     left_sprint = left_data[
-        (left_data['frame'] >= 44589) & 
+        (left_data['frame'] >= 44589) &
         (left_data['frame'] <= 45372)
     ]
     right_sprint = right_data[
-        (right_data['frame'] >= 46474) & 
+        (right_data['frame'] >= 46474) &
         (right_data['frame'] <= 47162)
     ]
-    
-    # Create figure with slider
-    fig = go.Figure()
-    
-    # Add frames for different offsets
-    frames = []
-    for offset in range(1800, 2000, 5):  # Create frames in steps of 5
-        frame_data = []
-        
-        # Add left camera tracks (these don't change)
-        for track_id in left_sprint['tracking_id'].unique():
-            track = left_sprint[left_sprint['tracking_id'] == track_id]
-            frame_data.append(
-                go.Scatter3d(
-                    x=track['pitch_x'],
-                    y=track['pitch_y'],
-                    z=track['frame'],
-                    mode='lines',
-                    name=f'Left {track_id}',
-                    line=dict(color='blue'),
-                    opacity=0.6
-                )
-            )
-        
-        # Add right camera tracks with current offset
-        for track_id in right_sprint['tracking_id'].unique():
-            track = right_sprint[right_sprint['tracking_id'] == track_id].copy()
-            track['frame'] = track['frame'] - offset
-            frame_data.append(
-                go.Scatter3d(
-                    x=track['pitch_x'],
-                    y=track['pitch_y'],
-                    z=track['frame'],
-                    mode='lines',
-                    name=f'Right {track_id}',
-                    line=dict(color='red'),
-                    opacity=0.6
-                )
-            )
-        
-        frames.append(go.Frame(data=frame_data, name=str(offset)))
-    
-    # Add initial data
-    initial_offset = 1885
-    for track_id in left_sprint['tracking_id'].unique():
-        track = left_sprint[left_sprint['tracking_id'] == track_id]
-        fig.add_trace(
-            go.Scatter3d(
-                x=track['pitch_x'],
-                y=track['pitch_y'],
-                z=track['frame'],
-                mode='lines',
-                name=f'Left {track_id}',
-                line=dict(color='blue'),
-                opacity=0.6
-            )
-        )
-    
-    for track_id in right_sprint['tracking_id'].unique():
-        track = right_sprint[right_sprint['tracking_id'] == track_id].copy()
-        track['frame'] = track['frame'] - initial_offset
-        fig.add_trace(
-            go.Scatter3d(
-                x=track['pitch_x'],
-                y=track['pitch_y'],
-                z=track['frame'],
-                mode='lines',
-                name=f'Right {track_id}',
-                line=dict(color='red'),
-                opacity=0.6
-            )
-        )
-    
-    # Add frames to figure
-    fig.frames = frames
-    
-    # Add slider
+
+    # Error curve from the vectorized offset search
+    offsets = np.asarray(offsets)
+    errors, _ = score_offsets(left_sprint, right_sprint, offsets, overlap_x_range)
+    if initial_offset is None:
+        initial_offset = int(offsets[np.nanargmin(errors)]) if not np.all(np.isnan(errors)) else int(offsets[0])
+
+    fig = make_subplots(
+        rows=1, cols=2,
+        specs=[[{'type': 'scene'}, {'type': 'xy'}]],
+        column_widths=[0.7, 0.3],
+        subplot_titles=('Sprint Comparison', 'Overlap Error by Offset')
+    )
+
+    # Left camera tracks (these don't change)
+    fig.add_trace(packed_trace(left_sprint, 'Left', color='blue', decimate=None), row=1, col=1)
+
+    # Right camera tracks, shifted by the slider in the browser
+    fig.add_trace(
+        packed_trace(right_sprint, 'Right', color='red', decimate=None, z_offset=initial_offset),
+        row=1, col=1
+    )
+
+    fig.add_trace(
+        go.Scatter(x=offsets, y=errors, mode='lines', name='Mean min distance', line=dict(color='orange')),
+        row=1, col=2
+    )
+    # Marker for the current offset, moved by the slider script (shapes[0])
+    fig.add_shape(
+        type='line', x0=initial_offset, x1=initial_offset, y0=0, y1=1,
+        xref='x', yref='y domain', line=dict(color='white', dash='dash')
+    )
+
     fig.update_layout(
         title="Interactive Sprint Comparison",
         scene=dict(
@@ -98,52 +69,76 @@ def create_interactive_view(left_data, right_data):
             zaxis_title='Frame',
             camera=dict(eye=dict(x=2, y=2, z=1.5))
         ),
-        updatemenus=[{
-            'type': 'buttons',
-            'showactive': False,
-            'buttons': [{
-                'label': 'Play',
-                'method': 'animate',
-                'args': [None, {
-                    'frame': {'duration': 100},
-                    'fromcurrent': True,
-                    'transition': {'duration': 0}
-                }]
-            }]
-        }],
-        sliders=[{
-            'currentvalue': {'prefix': 'Z Offset: '},
-            'pad': {'t': 50},
-            'steps': [
-                {
-                    'args': [[str(offset)], {
-                        'frame': {'duration': 0, 'redraw': True},
-                        'mode': 'immediate'
-                    }],
-                    'label': str(offset),
-                    'method': 'animate'
-                }
-                for offset in range(1800, 2000, 5)
-            ]
-        }]
+        xaxis=dict(title='Z Offset (frames)'),
+        yaxis=dict(title='Error'),
+        meta={'offsets': [int(offsets.min()), int(offsets.max())], 'initial_offset': initial_offset}
     )
-    
+
     return fig
 
+def offset_slider_script(min_offset, max_offset, initial_offset, right_trace=RIGHT_TRACE):
+    """JavaScript for a 1-frame-step offset slider acting on an existing plot
+
+    Passed to fig.write_html(post_script=...); plotly substitutes {plot_id}.
+    """
+    return """
+var gd = document.getElementById('{plot_id}');
+var initial = %(initial)d;
+// plotly.py may send arrays as base64 typed-array specs ({dtype, bdata})
+function values(array) {
+    if (!array || array.bdata === undefined) { return array; }
+    var types = {f4: Float32Array, f8: Float64Array, i1: Int8Array, u1: Uint8Array,
+                 i2: Int16Array, u2: Uint16Array, i4: Int32Array, u4: Uint32Array};
+    var bytes = Uint8Array.from(atob(array.bdata), function (c) { return c.charCodeAt(0); });
+    return new types[array.dtype](bytes.buffer);
+}
+// z as sent is frame - initial; keep the raw frames to shift from
+var base = Float64Array.from(values(gd.data[%(trace)d].z), function (v) { return v + initial; });
+
+var label = document.createElement('div');
+label.style.color = 'white';
+label.style.fontFamily = 'sans-serif';
+var slider = document.createElement('input');
+slider.type = 'range';
+slider.min = %(min)d;
+slider.max = %(max)d;
+slider.step = 1;
+slider.value = initial;
+slider.style.width = '60%%';
+gd.parentNode.insertBefore(label, gd);
+gd.parentNode.insertBefore(slider, gd);
+
+function applyOffset(offset) {
+    label.textContent = 'Z Offset: ' + offset;
+    var z = base.map(function (v) { return v - offset; });
+    Plotly.restyle(gd, {z: [z]}, [%(trace)d]);
+    Plotly.relayout(gd, {'shapes[0].x0': offset, 'shapes[0].x1': offset});
+}
+slider.addEventListener('input', function () { applyOffset(parseInt(slider.value, 10)); });
+label.textContent = 'Z Offset: ' + initial;
+""" % {'initial': initial_offset, 'trace': right_trace, 'min': min_offset, 'max': max_offset}
+
+def show_interactive_view(fig, output_path):
+    """Write the viewer with its offset slider and open it in the browser"""
+    min_offset, max_offset = fig.layout.meta['offsets']
+    script = offset_slider_script(min_offset, max_offset, fig.layout.meta['initial_offset'])
+    fig.write_html(output_path, post_script=script, include_plotlyjs='cdn')
+    webbrowser.open('file://' + os.path.abspath(output_path))
+
 if __name__ == "__main__":
     # Get absolute paths
     current_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.join(os.path.dirname(current_dir), 'data')
-    
+
     left_path = os.path.join(data_dir, 'camL_1.csv')
     right_path = os.path.join(data_dir, 'camR_1.csv')
-    
+
     print("Loading data...")
-    left_data = pd.read_csv(left_path)
-    right_data = pd.read_csv(right_path)
-    
+    left_data = load_tracks(left_path)
+    right_data = load_tracks(right_path)
+
     print("Creating interactive visualization...")
     fig = create_interactive_view(left_data, right_data)
-    
+
     print("Opening in browser...")
-    fig.show() 
\ No newline at end of file
+    show_interactive_view(fig, os.path.join(data_dir, 'offset_viewer.html'))
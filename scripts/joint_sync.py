@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from sync_estimator import estimate_sync_offset
+from overlap_region import occupancy_grid, shared_region, region_rows, detect_overlaps
+from track_cache import load_tracks
+from instrument import timed
+
+# Cameras from left to right across the pitch
+CAMERA_ORDER = ('L', 'M', 'R')
+# Columns the overlap channels are built from
+SIGNAL_COLUMNS = ('frame', 'pitch_x', 'pitch_y', 'team_id', 'velocity')
+
+
+def neighbour_pairs(names, reach=2):
+    """Camera pairs at most reach positions apart in the left-to-right order
+
+    With a fixed reach the number of pairs grows linearly with the number of
+    cameras, while reach >= 2 still closes a loop over every three neighbours.
+    """
+    return [(names[i], names[j]) for i in range(len(names))
+            for j in range(i + 1, min(i + reach + 1, len(names)))]
+
+
+def _region_columns(data, region):
+    """Only the shared-region rows and columns a pair estimate needs"""
+    mask = region_rows(data, region)
+    return pd.DataFrame({c: np.asarray(data[c])[mask] for c in SIGNAL_COLUMNS if c in data.columns})
+
+
+def _pair_offset(task):
+    name_a, name_b, band, rows_a, rows_b, lag_window = task
+    try:
+        result = estimate_sync_offset(rows_a, rows_b, band, lag_window)
+    except ValueError:
+        return None
+    return (name_a, name_b, band, result['offset'], result['confidence'], result['peak_correlation'])
+
+
+def pairwise_offsets(cameras, pairs, bands=None, lag_window=None, max_workers=None, regions=None):
+    """Estimate every pairwise lag concurrently
+
+    cameras: {name: DataFrame}; pairs: [(name_a, name_b), ...]. The rows used
+    for a pair come from regions {(name_a, name_b): region} (overlap_region),
+    or from bands {(name_a, name_b): overlap_x_range} for a plain x band;
+    pairs in neither get their shared region detected from the cameras'
+    occupancy grids. Each worker only receives the rows inside its region.
+
+    Returns a DataFrame with camera_a, camera_b, band, offset (camera_b frame =
+    camera_a frame + offset), confidence and peak_correlation. Pairs without
+    rows in their region are left out.
+    """
+    regions = dict(regions or {})
+    for pair, band in (bands or {}).items():
+        regions.setdefault(pair, {'x_range': tuple(band), 'y_range': (-np.inf, np.inf)})
+
+    grids = {}
+    tasks = []
+    for name_a, name_b in pairs:
+        if (name_a, name_b) not in regions:
+            for name in (name_a, name_b):
+                if name not in grids:
+                    grids[name] = occupancy_grid(cameras[name])
+            regions[name_a, name_b] = shared_region(grids[name_a], grids[name_b])
+        region = regions[name_a, name_b]
+        if region is None:
+            continue
+        tasks.append((name_a, name_b, region['x_range'],
+                      _region_columns(cameras[name_a], region), _region_columns(cameras[name_b], region),
+                      lag_window))
+
+    if max_workers == 1:
+        # Already inside a worker (batch runs): no nested pool
+        results = [r for r in map(_pair_offset, tasks) if r]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or max(len(tasks), 1)) as pool:
+            results = [r for r in pool.map(_pair_offset, tasks) if r]
+
+    return pd.DataFrame(results, columns=['camera_a', 'camera_b', 'band', 'offset',
+                                          'confidence', 'peak_correlation'])
+
+
+def reconcile_offsets(pairwise, names, reference=None):
+    """Per-camera offsets that best agree with all pairwise lags
+
+    Solves offset[b] - offset[a] = lag for every pair by weighted least
+    squares (weights from the pair confidence) with the reference camera fixed
+    at 0. Loop-closure residuals (lag_ab + lag_bc - lag_ac) are reported for
+    every triangle of measured pairs; a large one means one of its pairs is wrong.
+
+    Returns (offsets, pairwise, loops): offsets is {name: int}, pairwise gains
+    fitted and residual columns.
+    """
+    reference = reference or names[0]
+    unknowns = [n for n in names if n != reference]
+    column = {n: i for i, n in enumerate(unknowns)}
+
+    system = np.zeros((len(pairwise), len(unknowns)))
+    lags = pairwise['offset'].to_numpy(dtype=np.float64)
+    for row, (name_a, name_b) in enumerate(zip(pairwise['camera_a'], pairwise['camera_b'])):
+        if name_a in column:
+            system[row, column[name_a]] = -1
+        if name_b in column:
+            system[row, column[name_b]] = 1
+    weights = np.sqrt(np.maximum(pairwise['confidence'].to_numpy(dtype=np.float64), 1e-3))
+
+    solution = np.linalg.lstsq(system * weights[:, None], lags * weights, rcond=None)[0]
+    unresolved = [n for n in unknowns if not system[:, column[n]].any()]
+    if unresolved:
+        raise ValueError(f"No overlap links camera(s) {unresolved} to the others")
+
+    offsets = {reference: 0}
+    offsets.update({n: int(round(solution[column[n]])) for n in unknowns})
+
+    pairwise = pairwise.copy()
+    pairwise['fitted'] = [offsets[b] - offsets[a] for a, b in zip(pairwise['camera_a'], pairwise['camera_b'])]
+    pairwise['residual'] = pairwise['offset'] - pairwise['fitted']
+
+    lag = {(a, b): o for a, b, o in zip(pairwise['camera_a'], pairwise['camera_b'], pairwise['offset'])}
+    loops = [
+        (a, b, c, lag[a, b] + lag[b, c] - lag[a, c])
+        for i, a in enumerate(names) for j, b in enumerate(names[i + 1:], i + 1) for c in names[j + 1:]
+        if (a, b) in lag and (b, c) in lag and (a, c) in lag
+    ]
+    loops = pd.DataFrame(loops, columns=['camera_a', 'camera_b', 'camera_c', 'closure'])
+
+    return offsets, pairwise, loops
+
+
+@timed()
+def joint_sync(cameras, names=None, bands=None, lag_window=None, reach=2, max_workers=None, regions=None):
+    """Sync all cameras of a match at once: pairwise lags, then reconciliation"""
+    names = list(names or cameras)
+    pairwise = pairwise_offsets(cameras, neighbour_pairs(names, reach), bands, lag_window, max_workers, regions)
+    return reconcile_offsets(pairwise, names)
+
+
+def match_paths(data_dir, match, order=CAMERA_ORDER):
+    """{camera: path} for the camX_<match>.csv files of one match"""
+    return {name: os.path.join(data_dir, f'cam{name}_{match}.csv') for name in order}
+
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(current_dir), 'data')
+    match = sys.argv[2] if len(sys.argv) > 2 else '1'
+
+    print("Loading data...")
+    paths = match_paths(data_dir, match)
+    cameras = {name: load_tracks(path) for name, path in paths.items() if os.path.exists(path)}
+
+    names = [n for n in CAMERA_ORDER if n in cameras]
+    regions = detect_overlaps({n: paths[n] for n in names}, neighbour_pairs(names))
+    offsets, pairwise, loops = joint_sync(cameras, names, regions=regions)
+
+    print("\nPairwise lags:")
+    for row in pairwise.itertuples():
+        print(f"  {row.camera_a}-{row.camera_b}  x {row.band[0]:.0f}-{row.band[1]:.0f}: "
+              f"{row.offset:6d} (confidence {row.confidence:.1f}, residual {row.residual:+.0f})")
+    for row in loops.itertuples():
+        print(f"Loop {row.camera_a}-{row.camera_b}-{row.camera_c} closure: {row.closure:+d} frames")
+    print("\nCamera offsets (subtract from frame to align):")
+    for name, offset in offsets.items():
+        print(f"  cam{name}_{match}: {offset}")
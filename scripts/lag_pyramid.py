@@ -0,0 +1,146 @@
+import numpy as np
+import time
+from sync_estimator import overlap_rows, overlap_signals, channel_layout, standardize, correlate_signals
+from offset_search import build_frame_index, score_offsets
+from instrument import timed
+
+# About 22 fps: +/- 10 minutes of lag
+DEFAULT_LAG_WINDOW = (-13200, 13200)
+
+
+def pool_signals(signals, factor):
+    """Sum channels over blocks of factor frames (the last partial block is dropped)"""
+    if factor == 1:
+        return signals
+    n = signals.shape[1] // factor
+    return signals[:, :n * factor].reshape(signals.shape[0], n, factor).sum(axis=2)
+
+
+def correlation_at_shifts(left, right, shifts):
+    """sum_c sum_n left[c, n] * right[c, n + shift] for a few shifts, without an FFT"""
+    n_left, n_right = left.shape[1], right.shape[1]
+    scores = np.full(len(shifts), -np.inf)
+    for i, shift in enumerate(shifts):
+        lo = max(0, -shift)
+        hi = min(n_left, n_right - shift)
+        if hi > lo:
+            scores[i] = float((left[:, lo:hi] * right[:, lo + shift:hi + shift]).sum())
+    return scores
+
+
+def top_candidates(lags, scores, k, min_separation):
+    """Best k lags by score, at least min_separation frames apart"""
+    chosen = []
+    for i in np.argsort(scores)[::-1]:
+        if not np.isfinite(scores[i]):
+            break
+        if all(abs(lags[i] - c) >= min_separation for c in chosen):
+            chosen.append(int(lags[i]))
+            if len(chosen) == k:
+                break
+    return chosen
+
+
+@timed()
+def coarse_to_fine_offset(left_data, right_data, overlap_x_range=(290, 320), lag_window=DEFAULT_LAG_WINDOW,
+                          factors=(32, 8, 2), top_k=5, y_bins=8):
+    """Multi-resolution lag search over a wide window
+
+    The overlap channels (see sync_estimator) are temporally pooled into a
+    pyramid. The coarsest level is correlated over the whole lag_window with
+    an FFT; each finer level only re-scores lags around the top_k candidates
+    of the level above. Levels too coarse for a short clip are skipped. The
+    final level scores the surviving lags at full resolution with the
+    spatial mean-min-distance of offset_search.
+
+    Returns a dict with the offset and, per level, the factor, the lags and
+    scores evaluated, the candidates kept and the compute time in seconds.
+    """
+    start_time = time.perf_counter()
+    left_mask = overlap_rows(left_data, overlap_x_range)
+    right_mask = overlap_rows(right_data, overlap_x_range)
+    if not left_mask.any() or not right_mask.any():
+        raise ValueError("No rows in the overlap region for one of the cameras")
+    y_range, teams = channel_layout(left_data, right_data, left_mask, right_mask)
+
+    left_frames = np.asarray(left_data['frame'])[left_mask]
+    right_frames = np.asarray(right_data['frame'])[right_mask]
+    left_start, right_start = int(left_frames.min()), int(right_frames.min())
+    left_signals = overlap_signals(left_data, left_start, int(left_frames.max()) - left_start + 1,
+                                   overlap_x_range, y_range, y_bins, teams)
+    right_signals = overlap_signals(right_data, right_start, int(right_frames.max()) - right_start + 1,
+                                    overlap_x_range, y_range, y_bins, teams)
+    base = right_start - left_start
+    levels = [{'factor': 'signals', 'seconds': time.perf_counter() - start_time}]
+
+    # Levels that would pool a clip to fewer than 2 samples say nothing; with
+    # none left the full-resolution channels are correlated directly
+    shortest = min(left_signals.shape[1], right_signals.shape[1])
+    factors = [factor for factor in factors if shortest // factor >= 2] or [1]
+
+    candidates = None
+    previous_factor = None
+    for factor in factors:
+        level_start = time.perf_counter()
+        left = standardize(pool_signals(left_signals, factor))
+        right = standardize(pool_signals(right_signals, factor))
+
+        if candidates is None:
+            # Coarsest level: every lag in the window with one FFT
+            shifts, scores = correlate_signals(left, right)
+            lags = base + shifts * factor
+            keep = (lags >= lag_window[0]) & (lags <= lag_window[1])
+            lags, scores = lags[keep], scores[keep]
+        else:
+            # Finer level: only around the surviving candidates
+            radius = int(np.ceil(previous_factor / factor)) + 1
+            shifts = np.unique(np.concatenate([
+                int(round((c - base) / factor)) + np.arange(-radius, radius + 1) for c in candidates
+            ]))
+            scores = correlation_at_shifts(left, right, shifts)
+            lags = base + shifts * factor
+
+        candidates = top_candidates(lags, scores, top_k, min_separation=2 * factor)
+        if not candidates:
+            raise ValueError("Lag window does not overlap the recorded frames")
+        levels.append({
+            'factor': factor,
+            'lags': lags,
+            'scores': scores,
+            'candidates': candidates,
+            'seconds': time.perf_counter() - level_start
+        })
+        previous_factor = factor
+
+    # Full resolution: spatial distance around the final candidates
+    level_start = time.perf_counter()
+    radius = previous_factor
+    lags = np.unique(np.concatenate([np.arange(c - radius, c + radius + 1) for c in candidates]))
+    left_index = build_frame_index(left_data, overlap_x_range)
+    right_index = build_frame_index(right_data, overlap_x_range)
+    errors, _ = score_offsets(None, None, lags, left_index=left_index, right_index=right_index)
+    if np.all(np.isnan(errors)):
+        offset = candidates[0]
+    else:
+        offset = int(lags[np.nanargmin(errors)])
+    levels.append({
+        'factor': 1,
+        'lags': lags,
+        'scores': errors,
+        'candidates': [offset],
+        'seconds': time.perf_counter() - level_start
+    })
+
+    return {'offset': offset, 'levels': levels, 'seconds': time.perf_counter() - start_time}
+
+
+def print_levels(result):
+    """Summary of each pyramid level"""
+    for level in result['levels']:
+        if level['factor'] == 'signals':
+            print(f"signals:     {level['seconds'] * 1000:8.1f} ms")
+            continue
+        kind = 'distance' if level['factor'] == 1 else 'correlation'
+        print(f"factor {level['factor']:>3}:  {level['seconds'] * 1000:8.1f} ms, "
+              f"{len(level['lags'])} lags scored by {kind}, candidates {level['candidates']}")
+    print(f"total:       {result['seconds'] * 1000:8.1f} ms -> offset {result['offset']}")
@@ -0,0 +1,242 @@
+import numpy as np
+import os
+import time
+from sync_estimator import peak_sharpness
+from offset_search import build_frame_index
+
+# About 22 fps (see lag_pyramid.DEFAULT_LAG_WINDOW)
+FPS = 22
+
+
+class SignalRing:
+    """Ring buffer of per-frame overlap channels for one camera
+
+    Raw sums (y-cell occupancy, team counts, velocity sum, point count) are
+    accumulated per frame as rows arrive. A frame is complete once a later
+    frame has been seen; completed frames are standardized with running
+    statistics and kept in a second ring for the correlation.
+    """
+
+    def __init__(self, capacity, overlap_x_range, y_range, y_bins, teams, adapt=0.999):
+        self.capacity = capacity
+        self.overlap_x_range = overlap_x_range
+        self.y_range = y_range
+        self.y_bins = y_bins
+        self.teams = np.asarray(teams)
+        self.n_channels = y_bins + len(teams) + 1
+        self.adapt = adapt
+
+        self.raw = np.zeros((capacity, y_bins + len(teams) + 2))
+        self.raw_frame = np.full(capacity, -1, dtype=np.int64)
+        self.signals = np.zeros((capacity, self.n_channels))
+        self.signal_frame = np.full(capacity, -1, dtype=np.int64)
+        self.mean = np.zeros(self.n_channels)
+        self.var = np.ones(self.n_channels)
+        self.newest = None
+        self.done = None
+
+    def add_rows(self, frame, x, y, team, velocity):
+        """Accumulate rows; returns the frames completed by this batch"""
+        frame = np.asarray(frame, dtype=np.int64)
+        if len(frame) == 0:
+            return np.empty(0, dtype=np.int64)
+        if self.newest is None:
+            self.done = int(frame.min()) - 1
+        keep = frame > self.done
+        band = keep & (x >= self.overlap_x_range[0]) & (x <= self.overlap_x_range[1])
+
+        # Clear the slots of frames entering the buffer
+        newest = max(int(frame[keep].max()) if keep.any() else self.done, self.newest or self.done)
+        first_new = (self.newest if self.newest is not None else self.done) + 1
+        fresh = np.arange(max(first_new, newest - self.capacity + 1), newest + 1)
+        slots = fresh % self.capacity
+        self.raw[slots] = 0
+        self.raw_frame[slots] = fresh
+        self.newest = newest
+
+        frame, y, team, velocity = frame[band], y[band], team[band], velocity[band]
+        slot = frame % self.capacity
+        cell = np.clip(((y - self.y_range[0]) / (self.y_range[1] - self.y_range[0]) * self.y_bins).astype(np.int64),
+                       0, self.y_bins - 1)
+        np.add.at(self.raw, (slot, cell), 1)
+        for i, team_id in enumerate(self.teams):
+            np.add.at(self.raw[:, self.y_bins + i], slot[team == team_id], 1)
+        np.add.at(self.raw[:, -2], slot, np.nan_to_num(velocity))
+        np.add.at(self.raw[:, -1], slot, 1)
+
+        # Every frame before the newest one is complete
+        completed = np.arange(self.done + 1, self.newest)
+        completed = completed[completed > self.newest - self.capacity]
+        if len(completed):
+            self._complete(completed)
+            self.done = int(self.newest - 1)
+        return completed
+
+    def _complete(self, frames):
+        slots = frames % self.capacity
+        raw = self.raw[slots]
+        values = np.concatenate([raw[:, :-2], (raw[:, -2] / np.maximum(raw[:, -1], 1))[:, None]], axis=1)
+        for value in values:
+            # Exponentially weighted mean/variance, then standardize
+            delta = value - self.mean
+            self.mean += (1 - self.adapt) * delta
+            self.var = self.adapt * (self.var + (1 - self.adapt) * delta ** 2)
+        std = np.sqrt(self.var)
+        self.signals[slots] = np.divide(values - self.mean, std, out=np.zeros_like(values), where=std > 1e-9)
+        self.signal_frame[slots] = frames
+
+    def get(self, frames):
+        """Standardized channels of completed frames (zeros where missing), shape (n, channels)"""
+        slots = frames % self.capacity
+        valid = self.signal_frame[slots] == frames
+        return self.signals[slots] * valid[:, None]
+
+
+class LiveSync:
+    """Online lag estimate between two camera feeds
+
+    Keeps a running cross-correlation over lag_window, updated in the time
+    domain as frames complete: a completed left frame l adds
+    left[l] . right[l + lag] for every lag whose right frame is already
+    complete, and symmetrically for right frames, so each pair of frames is
+    counted exactly once. Old evidence decays by `decay` per completed frame,
+    so the estimate follows slow drift. Cost per frame is O(window * channels).
+
+    Each ring holds max(|lag_window|) + slack frames: a frame's partner is
+    about lag frames away on the other camera, and when both feeds start
+    together it arrives that much later, so the ring must still hold it.
+
+    The offset follows the match_overlap convention (right frame = left frame + offset).
+    """
+
+    def __init__(self, overlap_x_range=(290, 320), lag_window=(1800, 2000), y_range=(0, 700), y_bins=8,
+                 teams=(1, 2), decay=0.9999, slack=256):
+        self.lags = np.arange(lag_window[0], lag_window[1] + 1)
+        capacity = int(np.abs(self.lags).max()) + slack
+        self.left = SignalRing(capacity, overlap_x_range, y_range, y_bins, teams)
+        self.right = SignalRing(capacity, overlap_x_range, y_range, y_bins, teams)
+        self.correlation = np.zeros(len(self.lags))
+        self.decay = decay
+        self.frames_used = 0
+
+    def _accumulate(self, completed, own, other, sign):
+        for frame in completed:
+            value = own.get(np.array([frame]))[0]
+            # The partner frame of each lag on the other camera
+            partners = frame + sign * self.lags
+            slots = partners % other.capacity
+            # Only partners already complete on the other camera
+            valid = (other.signal_frame[slots] == partners) & (partners <= other.done)
+            self.correlation *= self.decay
+            self.correlation += (other.signals[slots] @ value) * valid
+            self.frames_used += 1
+
+    def push(self, camera, rows):
+        """Add rows (dict or DataFrame of arrays) from camera 'left' or 'right'
+
+        Rows of each camera must arrive in frame order. Returns the update
+        time in seconds.
+        """
+        start = time.perf_counter()
+        ring, other, sign = (self.left, self.right, 1) if camera == 'left' else (self.right, self.left, -1)
+        n = len(rows['frame'])
+        completed = ring.add_rows(
+            np.asarray(rows['frame']),
+            np.asarray(rows['pitch_x'], dtype=np.float64),
+            np.asarray(rows['pitch_y'], dtype=np.float64),
+            np.asarray(rows['team_id']) if 'team_id' in rows else np.full(n, -1),
+            np.asarray(rows['velocity'], dtype=np.float64) if 'velocity' in rows else np.zeros(n)
+        )
+        if other.done is not None:
+            self._accumulate(completed, ring, other, sign)
+        return time.perf_counter() - start
+
+    def estimate(self):
+        """Current offset and peak-to-sidelobe confidence (None before any overlap evidence)"""
+        if not self.correlation.any():
+            return {'offset': None, 'confidence': 0.0, 'frames_used': self.frames_used}
+        peak = int(np.argmax(self.correlation))
+        return {
+            'offset': int(self.lags[peak]),
+            'confidence': peak_sharpness(self.correlation, peak),
+            'frames_used': self.frames_used
+        }
+
+
+def _frame_batches(data):
+    """(frame, rows) for every frame of a camera, in frame order"""
+    index = build_frame_index(data)
+    order = np.argsort(np.asarray(data['frame']), kind='stable')
+    columns = {c: np.asarray(data[c])[order] for c in ['frame', 'pitch_x', 'pitch_y', 'team_id', 'velocity']
+               if c in data.columns}
+    for i, frame in enumerate(index['frames']):
+        lo, hi = index['starts'][i], index['starts'][i + 1]
+        yield int(frame), {c: values[lo:hi] for c, values in columns.items()}
+
+
+def replay(left_data, right_data, sync, speed=None, fps=FPS, report_every=None):
+    """Feed two recorded cameras to a LiveSync as if they were live
+
+    Both feeds start together at their first frame and advance at fps * speed
+    frames per second (speed=None replays as fast as possible). Yields
+    (left_frame, estimate, update_seconds) after every left frame, or every
+    report_every left frames.
+    """
+    left = _frame_batches(left_data)
+    right = _frame_batches(right_data)
+    left_start = int(np.min(np.asarray(left_data['frame'])))
+    right_start = int(np.min(np.asarray(right_data['frame'])))
+    pending_right = next(right, None)
+    wall_start = time.perf_counter()
+
+    for count, (frame, rows) in enumerate(left):
+        tick = frame - left_start
+        if speed:
+            delay = wall_start + tick / (fps * speed) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        seconds = sync.push('left', rows)
+        while pending_right is not None and pending_right[0] - right_start <= tick:
+            seconds += sync.push('right', pending_right[1])
+            pending_right = next(right, None)
+
+        if report_every is None or count % report_every == 0:
+            yield frame, sync.estimate(), seconds
+
+
+if __name__ == "__main__":
+    import sys
+    from sync_estimator import estimate_sync_offset
+    from track_cache import load_tracks
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+    speed = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    overlap_x_range = (463, 619)
+
+    print("Loading data...")
+    left_data = load_tracks(os.path.join(data_dir, 'camL_1.csv'))
+    right_data = load_tracks(os.path.join(data_dir, 'camR_1.csv'))
+
+    sync = LiveSync(overlap_x_range=overlap_x_range)
+    latencies = []
+    for frame, estimate, seconds in replay(left_data, right_data, sync, speed=speed):
+        latencies.append(seconds)
+        if len(latencies) % 500 == 0:
+            print(f"left frame {frame}: offset {estimate['offset']} "
+                  f"(confidence {estimate['confidence']:.1f})")
+
+    latencies = np.array(latencies) * 1000
+    print(f"\nUpdate latency: median {np.median(latencies):.2f} ms, "
+          f"p99 {np.percentile(latencies, 99):.2f} ms, max {latencies.max():.2f} ms")
+    final = sync.estimate()
+    print(f"Final estimate: {final}")
+
+    # Replay check: the live estimate must match the whole-match estimate
+    # over the same lag window
+    lag_window = (int(sync.lags[0]), int(sync.lags[-1]) + 1)
+    expected = estimate_sync_offset(left_data, right_data, overlap_x_range, lag_window)['offset']
+    if final['offset'] != expected:
+        sys.exit(f"Replay check failed: live offset {final['offset']}, whole-match offset {expected}")
+    print(f"Replay check passed: live and whole-match offsets agree ({expected})")
@@ -1,69 +1,36 @@
-import pandas as pd
 import plotly.graph_objects as go
 import os
+from track_cache import load_tracks
+from track_store import as_store
 import numpy as np
+from offset_search import score_offsets
+from instrument import timed
 
-def find_best_z_offset(left_data, right_data, overlap_x_range=(290, 320)):
+@timed('match_overlap.find_best_z_offset')
+def find_best_z_offset(left_data, right_data, overlap_x_range=(290, 320), lag_window=(1800, 2000)):
     """Find the best frame offset by matching patterns in overlap region"""
     
-    # Filter for overlap region
-    left_overlap = left_data[
-        (left_data['pitch_x'] >= overlap_x_range[0]) & 
-        (left_data['pitch_x'] <= overlap_x_range[1])
-    ]
-    right_overlap = right_data[
-        (right_data['pitch_x'] >= overlap_x_range[0]) & 
-        (right_data['pitch_x'] <= overlap_x_range[1])
-    ]
+    # Score every candidate offset with batched nearest-neighbour queries
+    # (see offset_search.score_offsets) instead of per-frame iterrows loops
+    lags = np.arange(lag_window[0], lag_window[1])
+    errors, matches = score_offsets(left_data, right_data, lags, overlap_x_range)
     
-    # Get unique frames
-    left_frames = sorted(left_overlap['frame'].unique())
-    right_frames = sorted(right_overlap['frame'].unique())
+    if np.all(np.isnan(errors)):
+        print("No overlapping frames for any offset")
+        return 0
     
-    # Try different offsets within a reasonable range
-    best_offset = 0
-    best_match = float('inf')
-    
-    # We expect offset to be around 1885 frames based on the sprint data
-    for offset in range(1800, 2000, 1):
-        error = 0
-        matches = 0
-        
-        # Compare player positions in overlap region
-        for left_frame in left_frames:
-            right_frame = left_frame + offset
-            
-            if right_frame not in right_frames:
-                continue
-                
-            left_pos = left_overlap[left_overlap['frame'] == left_frame][['pitch_x', 'pitch_y']]
-            right_pos = right_overlap[right_overlap['frame'] == right_frame][['pitch_x', 'pitch_y']]
-            
-            # Calculate minimum distances between points
-            for _, left_point in left_pos.iterrows():
-                if len(right_pos) > 0:
-                    min_dist = min(
-                        np.sqrt(((left_point - right_point)**2).sum()) 
-                        for _, right_point in right_pos.iterrows()
-                    )
-                    error += min_dist
-                    matches += 1
-        
-        if matches > 0:
-            avg_error = error / matches
-            if avg_error < best_match:
-                best_match = avg_error
-                best_offset = offset
-                print(f"New best offset: {offset} (error: {avg_error:.2f})")
+    best = np.nanargmin(errors)
+    best_offset = int(lags[best])
+    print(f"Best offset: {best_offset} (error: {errors[best]:.2f}, matches: {matches[best]})")
     
     return best_offset
 
+@timed('figure.match_overlap')
 def visualize_matched_data(left_data, right_data, z_offset):
     fig = go.Figure()
     
     # Plot left camera data in blue
-    for track_id in left_data['tracking_id'].unique():
-        track = left_data[left_data['tracking_id'] == track_id]
+    for track_id, track in as_store(left_data).tracks():
         fig.add_trace(
             go.Scatter3d(
                 x=track['pitch_x'],
@@ -77,9 +44,7 @@ def visualize_matched_data(left_data, right_data, z_offset):
         )
     
     # Plot right camera data in red with offset
-    for track_id in right_data['tracking_id'].unique():
-        track = right_data[right_data['tracking_id'] == track_id].copy()
-        track['frame'] = track['frame'] - z_offset  # Apply the offset
+    for track_id, track in as_store(right_data).aligned(z_offset).tracks():
         fig.add_trace(
             go.Scatter3d(
                 x=track['pitch_x'],
@@ -117,8 +82,8 @@ if __name__ == "__main__":
     right_path = os.path.join(data_dir, 'camR_1.csv')
     
     print("Loading data...")
-    left_data = pd.read_csv(left_path)
-    right_data = pd.read_csv(right_path)
+    left_data = load_tracks(left_path)
+    right_data = load_tracks(right_path)
     
     print("Finding best offset...")
     z_offset = find_best_z_offset(left_data, right_data)
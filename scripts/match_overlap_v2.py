@@ -1,9 +1,12 @@
 import pandas as pd
 import numpy as np
+from offset_search import score_offsets
+from instrument import timed
 import plotly.graph_objects as go
 import os
 
-def find_best_z_offset(left_data, right_data, overlap_x_range=(463, 619)):
+@timed('match_overlap_v2.find_best_z_offset')
+def find_best_z_offset(left_data, right_data, overlap_x_range=(463, 619), lag_window=(1800, 2000)):
     """Find the best frame offset by matching patterns in overlap region"""
     
     # First filter for the sprint frames
@@ -30,43 +33,21 @@ def find_best_z_offset(left_data, right_data, overlap_x_range=(463, 619)):
     print(f"Left camera: {len(left_overlap)}")
     print(f"Right camera: {len(right_overlap)}")
     
-    # Try different offsets within a reasonable range
-    best_offset = 0
-    best_match = float('inf')
-    
+    # Score all offsets within a reasonable range in one vectorized pass.
     # We expect offset to be around 1885 frames (46474 - 44589)
-    for offset in range(1800, 2000, 1):
-        error = 0
-        matches = 0
-        
-        # Compare player positions in overlap region
-        for left_frame in left_overlap['frame'].unique():
-            right_frame = left_frame + offset
-            
-            left_pos = left_overlap[left_overlap['frame'] == left_frame][['pitch_x', 'pitch_y']]
-            right_pos = right_overlap[right_overlap['frame'] == right_frame][['pitch_x', 'pitch_y']]
-            
-            if len(left_pos) == 0 or len(right_pos) == 0:
-                continue
-            
-            # Calculate minimum distances between points
-            for _, left_point in left_pos.iterrows():
-                min_dist = min(
-                    np.sqrt(((left_point - right_point)**2).sum()) 
-                    for _, right_point in right_pos.iterrows()
-                )
-                error += min_dist
-                matches += 1
-        
-        if matches > 0:
-            avg_error = error / matches
-            if avg_error < best_match:
-                best_match = avg_error
-                best_offset = offset
-                print(f"New best offset: {offset} (error: {avg_error:.2f})")
+    lags = np.arange(lag_window[0], lag_window[1])
+    errors, _ = score_offsets(left_overlap, right_overlap, lags, overlap_x_range=None)
+    
+    if np.all(np.isnan(errors)):
+        return 0
+    
+    best = np.nanargmin(errors)
+    best_offset = int(lags[best])
+    print(f"Best offset: {best_offset} (error: {errors[best]:.2f})")
     
     return best_offset
 
+@timed('figure.match_overlap_v2')
 def visualize_matched_tracks(left_data, right_data, offset):
     fig = go.Figure()
     
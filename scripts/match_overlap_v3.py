@@ -1,89 +1,23 @@
-import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import os
+from track_cache import load_tracks
+from track_store import as_store
+from lag_pyramid import coarse_to_fine_offset, print_levels, DEFAULT_LAG_WINDOW
+from instrument import timed
 
-def find_best_z_offset(left_data, right_data, overlap_x_range=(463, 619)):
-    """Find the best frame offset using vectorized operations"""
+@timed('match_overlap_v3.find_best_z_offset')
+def find_best_z_offset(left_data, right_data, overlap_x_range=(463, 619), lag_window=DEFAULT_LAG_WINDOW):
+    """Find the best frame offset with a coarse-to-fine search over the whole match"""
     
-    # First filter for the sprint frames only
-    left_sprint = left_data[
-        (left_data['frame'] >= 44589) & 
-        (left_data['frame'] <= 45372)
-    ].copy()
-    
-    right_sprint = right_data[
-        (right_data['frame'] >= 46474) & 
-        (right_data['frame'] <= 47162)
-    ].copy()
-    
-    print(f"Filtered to sprint frames:")
-    print(f"Left frames: {left_sprint['frame'].min()} - {left_sprint['frame'].max()}")
-    print(f"Right frames: {right_sprint['frame'].min()} - {right_sprint['frame'].max()}")
-    
-    # Filter for overlap region
-    left_overlap = left_sprint[
-        (left_sprint['pitch_x'] >= overlap_x_range[0]) & 
-        (left_sprint['pitch_x'] <= overlap_x_range[1])
-    ]
-    right_overlap = right_sprint[
-        (right_sprint['pitch_x'] >= overlap_x_range[0]) & 
-        (right_sprint['pitch_x'] <= overlap_x_range[1])
-    ]
-    
-    print(f"\nPoints in overlap region:")
-    print(f"Left camera: {len(left_overlap)}")
-    print(f"Right camera: {len(right_overlap)}")
-    
-    # Create frame counts for quick matching
-    left_counts = left_overlap.groupby('frame').size()
-    right_counts = right_overlap.groupby('frame').size()
-    
-    # Try offsets in steps of 5 frames first
-    best_offset = 1885  # Initial guess based on frame numbers
-    best_match = float('inf')
-    
-    # Coarse search
-    for offset in range(1800, 2000, 5):
-        # Shift right frames by offset
-        shifted_right = right_counts.index - offset
-        
-        # Find overlapping frames
-        common_frames = left_counts.index.intersection(shifted_right)
-        
-        if len(common_frames) > 0:
-            # Compare player counts
-            error = abs(
-                left_counts[common_frames] - 
-                right_counts[common_frames + offset]
-            ).mean()
-            
-            if error < best_match:
-                best_match = error
-                best_offset = offset
-                print(f"New best offset: {offset} (error: {error:.2f})")
-    
-    # Fine search around best offset
-    fine_best = best_offset
-    fine_error = best_match
-    
-    for offset in range(best_offset - 4, best_offset + 5):
-        shifted_right = right_counts.index - offset
-        common_frames = left_counts.index.intersection(shifted_right)
-        
-        if len(common_frames) > 0:
-            error = abs(
-                left_counts[common_frames] - 
-                right_counts[common_frames + offset]
-            ).mean()
-            
-            if error < fine_error:
-                fine_error = error
-                fine_best = offset
-                print(f"Fine tuned offset: {offset} (error: {error:.2f})")
+    # Pooled overlap signals narrow a +/- 10 minute window down to a few
+    # candidates, which are then scored at full resolution by spatial distance
+    result = coarse_to_fine_offset(left_data, right_data, overlap_x_range, lag_window)
+    print_levels(result)
     
-    return fine_best
+    return result['offset']
 
+@timed('figure.match_overlap_v3')
 def visualize_matched_tracks(left_data, right_data, offset):
     # Filter for sprint frames
     left_sprint = left_data[
@@ -98,8 +32,7 @@ def visualize_matched_tracks(left_data, right_data, offset):
     fig = go.Figure()
     
     # Plot left camera data
-    for track_id in left_sprint['tracking_id'].unique():
-        track = left_sprint[left_sprint['tracking_id'] == track_id]
+    for track_id, track in as_store(left_sprint).tracks():
         fig.add_trace(
             go.Scatter3d(
                 x=track['pitch_x'],
@@ -113,9 +46,7 @@ def visualize_matched_tracks(left_data, right_data, offset):
         )
     
     # Plot right camera data with offset
-    for track_id in right_sprint['tracking_id'].unique():
-        track = right_sprint[right_sprint['tracking_id'] == track_id].copy()
-        track['frame'] = track['frame'] - offset
+    for track_id, track in as_store(right_sprint).aligned(offset).tracks():
         fig.add_trace(
             go.Scatter3d(
                 x=track['pitch_x'],
@@ -147,8 +78,8 @@ if __name__ == "__main__":
     right_path = os.path.join(data_dir, 'camR_1.csv')
     
     print("Loading data...")
-    left_data = pd.read_csv(left_path)
-    right_data = pd.read_csv(right_path)
+    left_data = load_tracks(left_path)
+    right_data = load_tracks(right_path)
     
     print("\nFinding best offset...")
     offset = find_best_z_offset(left_data, right_data)
@@ -0,0 +1,111 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def build_frame_index(data, overlap_x_range=None):
+    """Build per-frame point arrays (sorted by frame, CSR-style offsets)
+
+    Returns a dict with:
+        frames  - sorted unique frame numbers
+        starts  - offsets into the point arrays, starts[i]:starts[i+1] is frames[i]
+        frame   - frame number of every point (sorted)
+        xy      - (n, 2) float64 array of pitch_x/pitch_y
+    """
+    frame = np.asarray(data['frame'])
+    xy = np.column_stack([
+        np.asarray(data['pitch_x'], dtype=np.float64),
+        np.asarray(data['pitch_y'], dtype=np.float64)
+    ])
+
+    if overlap_x_range is not None:
+        in_band = (xy[:, 0] >= overlap_x_range[0]) & (xy[:, 0] <= overlap_x_range[1])
+        frame = frame[in_band]
+        xy = xy[in_band]
+
+    order = np.argsort(frame, kind='stable')
+    frame = frame[order].astype(np.int64)
+    xy = xy[order]
+
+    frames, starts = np.unique(frame, return_index=True)
+    starts = np.append(starts, len(frame))
+
+    return {'frames': frames, 'starts': starts, 'frame': frame, 'xy': xy}
+
+
+def _frame_scale(left_index, right_index):
+    """Spacing between frames in the (x, y, frame) KD-tree
+
+    Must be larger than any in-plane distance so that the nearest neighbour
+    of a point is always taken from the requested frame when that frame exists.
+    """
+    xy = np.vstack([left_index['xy'], right_index['xy']])
+    if len(xy) == 0:
+        return 1.0
+    extent = xy.max(axis=0) - xy.min(axis=0)
+    return 2.0 * float(np.hypot(*extent)) + 1.0
+
+
+def score_offsets(left_data, right_data, lags=range(1800, 2000), overlap_x_range=(290, 320),
+                  left_index=None, right_index=None):
+    """Mean minimum distance between overlap points for every candidate lag
+
+    A left point at frame f is compared against the right points at frame
+    f + lag (the same convention as match_overlap.find_best_z_offset). For each
+    lag the error is the mean, over all left points whose matching right frame
+    has points, of the distance to the nearest right point. Lags with no
+    matches get NaN.
+
+    Pre-built indexes (from build_frame_index) can be passed to skip the
+    filtering/sorting step when scoring several lag windows on the same data.
+    """
+    lags = np.asarray(lags, dtype=np.int64)
+    if left_index is None:
+        left_index = build_frame_index(left_data, overlap_x_range)
+    if right_index is None:
+        right_index = build_frame_index(right_data, overlap_x_range)
+
+    errors = np.full(len(lags), np.nan)
+    matches = np.zeros(len(lags), dtype=np.int64)
+    if len(left_index['frame']) == 0 or len(right_index['frame']) == 0:
+        return errors, matches
+
+    # One tree over all right points, with frame as a widely spaced third axis.
+    # Querying (x, y, (f + lag) * scale) then returns the nearest point in frame
+    # f + lag, or nothing within the bound if that frame is empty.
+    scale = _frame_scale(left_index, right_index)
+    right_pts = np.column_stack([right_index['xy'], right_index['frame'] * scale])
+    tree = cKDTree(right_pts)
+
+    left_xy = left_index['xy']
+    left_frame = left_index['frame']
+    left_frames = left_index['frames']
+    left_counts = np.diff(left_index['starts'])
+    right_frames = right_index['frames']
+    query = np.empty((len(left_xy), 3))
+    query[:, :2] = left_xy
+
+    for i, lag in enumerate(lags):
+        # Only query left points whose shifted frame exists on the right
+        shifted = left_frames + lag
+        pos = np.minimum(np.searchsorted(right_frames, shifted), len(right_frames) - 1)
+        present = np.repeat(right_frames[pos] == shifted, left_counts)
+        if not present.any():
+            continue
+        query[:, 2] = (left_frame + lag) * scale
+        dist, _ = tree.query(query[present], k=1, distance_upper_bound=scale / 2, workers=-1)
+        dist = dist[np.isfinite(dist)]
+        if len(dist) > 0:
+            errors[i] = dist.mean()
+            matches[i] = len(dist)
+
+    return errors, matches
+
+
+def find_best_offset(left_data, right_data, lags=range(1800, 2000), overlap_x_range=(290, 320)):
+    """Return (best_lag, lags, errors) using the vectorized scoring engine"""
+    lags = np.asarray(lags, dtype=np.int64)
+    errors, _ = score_offsets(left_data, right_data, lags, overlap_x_range)
+    if np.all(np.isnan(errors)):
+        return 0, lags, errors
+    best = int(lags[np.nanargmin(errors)])
+    return best, lags, errors
@@ -0,0 +1,236 @@
+import numpy as np
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from track_cache import CACHE_DIR_NAME, cache_path, cache_meta, load_tracks
+
+# Grid cell size in pitch units for the occupancy histograms
+CELL = 10.0
+OVERLAPS_FILE = 'overlaps.json'
+
+
+def occupancy_grid(data, cell=CELL):
+    """2D histogram of a camera's points over the pitch in one pass
+
+    Cells are aligned to multiples of cell so grids of different cameras
+    line up. Returns {'counts': (nx, ny) array, 'origin': (cx0, cy0) in
+    cells, 'cell': cell}.
+    """
+    x = np.asarray(data['pitch_x'], dtype=np.float64)
+    y = np.asarray(data['pitch_y'], dtype=np.float64)
+    valid = np.isfinite(x) & np.isfinite(y)
+    cx = np.floor(x[valid] / cell).astype(np.int64)
+    cy = np.floor(y[valid] / cell).astype(np.int64)
+    if len(cx) == 0:
+        return {'counts': np.zeros((0, 0), dtype=np.int64), 'origin': (0, 0), 'cell': cell}
+
+    cx0, cy0 = int(cx.min()), int(cy.min())
+    nx, ny = int(cx.max()) - cx0 + 1, int(cy.max()) - cy0 + 1
+    counts = np.bincount((cx - cx0) * ny + (cy - cy0), minlength=nx * ny).reshape(nx, ny)
+    return {'counts': counts, 'origin': (cx0, cy0), 'cell': cell}
+
+
+def camera_occupancy(csv_path, cell=CELL, cache_dir=None):
+    """Occupancy grid of a camera CSV, cached next to its column cache
+
+    The grid lives inside the camera's track_cache directory, so it is
+    dropped whenever that cache is rebuilt for a changed source file.
+    """
+    data = load_tracks(csv_path, cache_dir)
+    path = os.path.join(cache_path(csv_path, cache_dir), f'occupancy_{cell:g}.npz')
+    if os.path.exists(path):
+        with np.load(path) as stored:
+            return {'counts': stored['counts'], 'origin': tuple(int(v) for v in stored['origin']),
+                    'cell': cell}
+
+    grid = occupancy_grid(data, cell)
+    try:
+        fd, tmp = tempfile.mkstemp(suffix='.npz.tmp', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, counts=grid['counts'], origin=np.array(grid['origin']))
+        os.replace(tmp, path)
+    except OSError:
+        # The column cache was rebuilt meanwhile; the grid is recomputed next time
+        pass
+    return grid
+
+
+@contextmanager
+def _locked(path):
+    """Exclusive lock on path + '.lock' for a read-modify-write of path"""
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_store(store_path):
+    try:
+        with open(store_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _on_common_grid(grid_a, grid_b):
+    """Both count arrays padded onto one shared cell range, plus its origin"""
+    (ax, ay), (bx, by) = grid_a['origin'], grid_b['origin']
+    x0, y0 = min(ax, bx), min(ay, by)
+    x1 = max(ax + grid_a['counts'].shape[0], bx + grid_b['counts'].shape[0])
+    y1 = max(ay + grid_a['counts'].shape[1], by + grid_b['counts'].shape[1])
+
+    padded = []
+    for grid, (gx, gy) in ((grid_a, (ax, ay)), (grid_b, (bx, by))):
+        counts = np.zeros((x1 - x0, y1 - y0), dtype=np.int64)
+        nx, ny = grid['counts'].shape
+        counts[gx - x0:gx - x0 + nx, gy - y0:gy - y0 + ny] = grid['counts']
+        padded.append(counts)
+    return padded[0], padded[1], (x0, y0)
+
+
+def _covered(profile, min_fraction):
+    """Cells of a 1D profile holding at least min_fraction of a typical occupied cell"""
+    occupied = profile[profile > 0]
+    if len(occupied) == 0:
+        return np.zeros(len(profile), dtype=bool)
+    return profile >= min_fraction * np.median(occupied)
+
+
+def _longest_run(mask):
+    """(start, stop) of the longest run of True values, or None"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts, stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return None
+    longest = int(np.argmax(stops - starts))
+    return int(starts[longest]), int(stops[longest])
+
+
+def shared_region(grid_a, grid_b, min_fraction=0.05):
+    """Pitch rectangle both cameras actually see
+
+    x: the longest run of grid columns where both cameras have more than
+    min_fraction of their typical column occupancy. y: the span of rows
+    both cameras cover inside that x band. Robust to a few stray detections
+    far outside a camera's view.
+
+    Returns {'x_range', 'y_range', 'points_a', 'points_b'} or None when the
+    cameras share no columns.
+    """
+    if grid_a['cell'] != grid_b['cell']:
+        raise ValueError("Occupancy grids use different cell sizes")
+    cell = grid_a['cell']
+    counts_a, counts_b, (x0, y0) = _on_common_grid(grid_a, grid_b)
+
+    run = _longest_run(_covered(counts_a.sum(axis=1), min_fraction) &
+                       _covered(counts_b.sum(axis=1), min_fraction))
+    if run is None:
+        return None
+    band_a, band_b = counts_a[run[0]:run[1]], counts_b[run[0]:run[1]]
+
+    rows = np.flatnonzero(_covered(band_a.sum(axis=0), min_fraction) &
+                          _covered(band_b.sum(axis=0), min_fraction))
+    if len(rows) == 0:
+        return None
+    rows = slice(rows[0], rows[-1] + 1)
+
+    return {
+        'x_range': (float((x0 + run[0]) * cell), float((x0 + run[1]) * cell)),
+        'y_range': (float((y0 + rows.start) * cell), float((y0 + rows.stop) * cell)),
+        'points_a': int(band_a[:, rows].sum()),
+        'points_b': int(band_b[:, rows].sum())
+    }
+
+
+def region_rows(data, region):
+    """Boolean mask of the rows inside a shared region (x and y)"""
+    x = np.asarray(data['pitch_x'])
+    y = np.asarray(data['pitch_y'])
+    (x_lo, x_hi), (y_lo, y_hi) = region['x_range'], region['y_range']
+    return (x >= x_lo) & (x <= x_hi) & (y >= y_lo) & (y <= y_hi)
+
+
+def crop_to_region(data, region):
+    """Only the rows of a camera that fall in the shared region
+
+    Estimators given the cropped table scan a small fraction of a wide
+    camera's rows; their overlap_x_range is then region['x_range'].
+    """
+    return data[region_rows(data, region)].reset_index(drop=True)
+
+
+def detect_overlaps(paths, pairs, cell=CELL, min_fraction=0.05, cache_dir=None):
+    """Shared region of every camera pair, cached with the data
+
+    paths: {name: csv_path}; pairs: [(name_a, name_b), ...]. Results are kept
+    in overlaps.json in the data's cache directory, keyed by file name and
+    checked against the source hashes of both cameras' column caches. New
+    entries are merged into the file under a lock, so several processes
+    (e.g. batch workers for matches in one directory) can share it.
+
+    Returns {(name_a, name_b): region or None}.
+    """
+    first = next(iter(paths.values()))
+    store_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(first)), CACHE_DIR_NAME)
+    store_path = os.path.join(store_dir, OVERLAPS_FILE)
+    store = _read_store(store_path)
+
+    grids = {}
+    regions = {}
+    changed = {}
+    for name_a, name_b in pairs:
+        path_a, path_b = paths[name_a], paths[name_b]
+        key = f"{os.path.basename(path_a)}|{os.path.basename(path_b)}|{cell:g}|{min_fraction:g}"
+        for name in (name_a, name_b):
+            if name not in grids:
+                grids[name] = camera_occupancy(paths[name], cell, cache_dir)
+        hashes = [cache_meta(path_a, cache_dir)['source_hash'], cache_meta(path_b, cache_dir)['source_hash']]
+
+        entry = store.get(key)
+        if entry is None or entry['source_hashes'] != hashes:
+            entry = {'source_hashes': hashes, 'region': shared_region(grids[name_a], grids[name_b], min_fraction)}
+            changed[key] = entry
+        region = entry['region']
+        if region is not None:
+            region = dict(region, x_range=tuple(region['x_range']), y_range=tuple(region['y_range']))
+        regions[name_a, name_b] = region
+
+    if changed:
+        os.makedirs(store_dir, exist_ok=True)
+        with _locked(store_path):
+            # Re-read under the lock so other processes' entries are kept
+            store = _read_store(store_path)
+            store.update(changed)
+            fd, tmp = tempfile.mkstemp(prefix=OVERLAPS_FILE + '.', suffix='.tmp', dir=store_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(store, f, indent=2)
+            os.replace(tmp, store_path)
+    return regions
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from joint_sync import CAMERA_ORDER, match_paths, neighbour_pairs
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(current_dir), 'data')
+    match = sys.argv[2] if len(sys.argv) > 2 else '1'
+
+    paths = {name: path for name, path in match_paths(data_dir, match).items() if os.path.exists(path)}
+    names = [n for n in CAMERA_ORDER if n in paths]
+
+    start = time.perf_counter()
+    regions = detect_overlaps(paths, neighbour_pairs(names))
+    print(f"Detected overlaps in {time.perf_counter() - start:.2f} s")
+    for (name_a, name_b), region in regions.items():
+        if region is None:
+            print(f"  cam{name_a}-cam{name_b}: no shared region")
+            continue
+        print(f"  cam{name_a}-cam{name_b}: x {region['x_range'][0]:.0f}-{region['x_range'][1]:.0f}, "
+              f"y {region['y_range'][0]:.0f}-{region['y_range'][1]:.0f} "
+              f"({region['points_a']} / {region['points_b']} points)")
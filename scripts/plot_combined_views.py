@@ -2,34 +2,14 @@ import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
+from track_quality import filter_tracks
+from trace_render import packed_trace
 
 def load_and_filter_data(file_path):
     """Load and filter data with the same parameters as analyze_tracking_data"""
     data = pd.read_csv(file_path)
     
-    # Quality filtering parameters
-    VELOCITY_THRESHOLD = 50
-    MIN_TRACK_LENGTH = 30
-    MAX_POSITION_JUMP = 50
-    
-    valid_track_ids = []
-    for track_id in data['tracking_id'].unique():
-        track = data[data['tracking_id'] == track_id]
-        track_length = len(track)
-        max_velocity = track['velocity'].max() if 'velocity' in data.columns else 0
-        x_jumps = abs(track['pitch_x'].diff()).max()
-        y_jumps = abs(track['pitch_y'].diff()).max()
-        
-        is_valid = (
-            track_length >= MIN_TRACK_LENGTH and
-            max_velocity <= VELOCITY_THRESHOLD and
-            x_jumps <= MAX_POSITION_JUMP and
-            y_jumps <= MAX_POSITION_JUMP
-        )
-        if is_valid:
-            valid_track_ids.append(track_id)
-    
-    return data[data['tracking_id'].isin(valid_track_ids)]
+    return filter_tracks(data)
 
 def create_combined_visualization():
     data_files = [
@@ -59,22 +39,8 @@ def create_combined_visualization():
         print(f"Processing {file_name}...")
         data = load_and_filter_data(file_path)
         
-        # Plot each track
-        for track_id in data['tracking_id'].unique():
-            track_data = data[data['tracking_id'] == track_id].copy()
-            track_data = track_data.iloc[::3]  # Downsample for performance
-            
-            fig.add_trace(
-                go.Scatter3d(
-                    x=track_data['pitch_x'],
-                    y=track_data['pitch_y'],
-                    z=track_data['frame'],
-                    mode='lines',
-                    name=f"{file_name} - Track {track_id}",
-                    line=dict(color=color, width=2),
-                    opacity=0.6
-                )
-            )
+        # All tracks of the camera in one trace
+        fig.add_trace(packed_trace(data, file_name, color=color))
     
     # Update layout
     fig.update_layout(
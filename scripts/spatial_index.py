@@ -0,0 +1,142 @@
+import numpy as np
+
+
+class FrameGridIndex:
+    """Uniform pitch grid per frame for radius queries across cameras
+
+    Points are sorted by one integer key per (frame, x cell, y cell), so the
+    points of any cell of any frame are a contiguous slice found with a
+    binary search. A radius query only visits the cells around the query
+    point in frames f - k .. f + k, and batched queries do all of that with
+    array operations.
+
+    Query results are indices into the arrays the index was built from.
+    A cell about twice the query radius keeps it to four cells per frame.
+    """
+
+    def __init__(self, x, y, frame, cell=20.0):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        frame = np.asarray(frame, dtype=np.int64)
+        self.cell = float(cell)
+        self.size = len(frame)
+
+        if self.size:
+            self.x_min, self.y_min = x.min(), y.min()
+            self.first_frame, self.last_frame = int(frame.min()), int(frame.max())
+            self.nx = int((x.max() - self.x_min) // self.cell) + 1
+            self.ny = int((y.max() - self.y_min) // self.cell) + 1
+        else:
+            self.x_min = self.y_min = 0.0
+            self.first_frame, self.last_frame = 0, -1
+            self.nx = self.ny = 1
+
+        keys = self._keys(frame, self._cells(x, self.x_min), self._cells(y, self.y_min))
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.x = x[self.order]
+        self.y = y[self.order]
+        self.frame = frame[self.order]
+
+    @classmethod
+    def from_data(cls, data, overlap_x_range=None, cell=20.0):
+        """Index the rows of a camera table, optionally only inside an x band
+
+        With a band, results are still row positions in the full table.
+        """
+        x = np.asarray(data['pitch_x'])
+        y = np.asarray(data['pitch_y'])
+        frame = np.asarray(data['frame'])
+        rows = np.arange(len(x))
+        if overlap_x_range is not None:
+            rows = np.flatnonzero((x >= overlap_x_range[0]) & (x <= overlap_x_range[1]))
+        index = cls(x[rows], y[rows], frame[rows], cell)
+        index.order = rows[index.order]
+        return index
+
+    def _cells(self, values, origin):
+        return np.floor((np.asarray(values, dtype=np.float64) - origin) / self.cell).astype(np.int64)
+
+    def _keys(self, frame, cx, cy):
+        return ((frame - self.first_frame) * self.nx + cx) * self.ny + cy
+
+    def query_pairs(self, x, y, frame, radius, k=0, block=65536):
+        """All (query, point, distance) with the point within radius of the query
+        and its frame within k of the query frame
+
+        Returns (query_indices, point_indices, distances); point indices
+        refer to the data the index was built from.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        frame = np.atleast_1d(np.asarray(frame, dtype=np.int64))
+        # Cells overlapping [x - radius, x + radius]: at most `span` per axis
+        span = int(np.ceil(2 * radius / self.cell)) + 1
+        dcx, dcy, dframe = [d.ravel() for d in np.meshgrid(
+            np.arange(span), np.arange(span), np.arange(-k, k + 1), indexing='ij')]
+
+        found = ([], [], [])
+        for start in range(0, len(x), block):
+            qx, qy, qf = x[start:start + block], y[start:start + block], frame[start:start + block]
+            cx = self._cells(qx - radius, self.x_min)[:, None] + dcx
+            cy = self._cells(qy - radius, self.y_min)[:, None] + dcy
+            cf = qf[:, None] + dframe
+            valid = ((cx >= 0) & (cx < self.nx) & (cy >= 0) & (cy < self.ny) &
+                     (cx <= self._cells(qx + radius, self.x_min)[:, None]) &
+                     (cy <= self._cells(qy + radius, self.y_min)[:, None]) &
+                     (cf >= self.first_frame) & (cf <= self.last_frame))
+            keys = self._keys(cf, cx, cy)[valid]
+            owner = np.broadcast_to(np.arange(len(qx))[:, None], valid.shape)[valid]
+
+            lo = np.searchsorted(self.keys, keys, side='left')
+            counts = np.searchsorted(self.keys, keys, side='right') - lo
+            total = int(counts.sum())
+            if total == 0:
+                continue
+
+            # Expand each candidate cell into the positions of its points
+            query = np.repeat(owner, counts)
+            ends = np.cumsum(counts)
+            position = np.arange(total) - np.repeat(ends - counts, counts) + np.repeat(lo, counts)
+
+            dist = np.hypot(self.x[position] - qx[query], self.y[position] - qy[query])
+            near = dist <= radius
+            found[0].append(query[near] + start)
+            found[1].append(self.order[position[near]])
+            found[2].append(dist[near])
+
+        if not found[0]:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+        return tuple(np.concatenate(part) for part in found)
+
+    def query_radius(self, x, y, frame, radius, k=0):
+        """Indices of the points within radius of (x, y) at frames frame - k .. frame + k"""
+        _, points, _ = self.query_pairs([x], [y], [frame], radius, k)
+        return points
+
+    def count_within(self, x, y, frame, radius, k=0):
+        """Number of indexed points near each query point"""
+        queries, _, _ = self.query_pairs(x, y, frame, radius, k)
+        return np.bincount(queries, minlength=len(np.atleast_1d(x)))
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    from track_cache import load_tracks
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(data_dir, 'camL_1.csv')
+
+    data = load_tracks(path)
+    start = time.perf_counter()
+    index = FrameGridIndex.from_data(data)
+    print(f"Built index over {index.size} points in {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    queries, points, _ = index.query_pairs(data['pitch_x'], data['pitch_y'], data['frame'], radius=10.0)
+    elapsed = time.perf_counter() - start
+    print(f"{len(data)} radius queries in {elapsed:.2f} s "
+          f"({len(data) / elapsed / 1e6:.1f} M points/s, {len(points)} neighbours)")
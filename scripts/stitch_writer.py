@@ -0,0 +1,291 @@
+import numpy as np
+import pandas as pd
+import json
+import os
+from time_align import as_alignment
+from stitching import link_identities, global_ids, track_spans
+from subframe_sync import resample_rows
+from track_cache import load_tracks
+from track_stream import CHUNK_ROWS, iter_frame_chunks
+from instrument import timed
+
+# One record per (frame, global_id) of the stitched match
+STITCHED_DTYPE = np.dtype([
+    ('frame', np.int32),
+    ('global_id', np.int32),
+    ('team_id', np.int8),
+    ('n_cameras', np.int8),
+    ('pitch_x', np.float32),
+    ('pitch_y', np.float32),
+    ('velocity', np.float32)
+])
+STREAM_COLUMNS = ['frame', 'tracking_id', 'team_id', 'pitch_x', 'pitch_y', 'velocity']
+
+
+def _rows_dict(frame, chunk, index, identities, name, rows=None, next_rows=None, weight=None):
+    """Stream rows of one camera; with an interpolation plan, positions are
+    blended between rows and next_rows"""
+    def column(c, interpolate=False):
+        values = chunk[c].to_numpy(dtype=np.float64) if interpolate else chunk[c].to_numpy()
+        if rows is None:
+            return values
+        if not interpolate:
+            return values[rows]
+        return (1 - weight) * values[rows] + weight * values[next_rows]
+
+    n = len(frame)
+    return {
+        'frame': frame,
+        'global_id': global_ids(identities, name, column('tracking_id')),
+        'team_id': column('team_id') if 'team_id' in chunk else np.full(n, -1),
+        'pitch_x': column('pitch_x', True),
+        'pitch_y': column('pitch_y', True),
+        'velocity': np.nan_to_num(column('velocity', True)) if 'velocity' in chunk else np.zeros(n),
+        'camera': np.full(n, 1 << index, dtype=np.int64)
+    }
+
+
+def _camera_chunks(path, index, offset, identities, name, chunk_rows, keep=None, resample=False):
+    """Chunks of one camera on the reference clock, tracks mapped to global ids
+
+    With resample, rows are interpolated onto integer reference frames
+    (subframe_sync.resample_rows) instead of rounding the aligned frame. The
+    rows of each chunk's last frame are carried over, since they interpolate
+    towards the next chunk.
+    """
+    columns = pd.read_csv(path, nrows=0).columns
+    carry = None
+    for chunk in iter_frame_chunks(path, chunk_rows, usecols=[c for c in STREAM_COLUMNS if c in columns]):
+        if keep is not None:
+            chunk = chunk[np.isin(chunk['tracking_id'].to_numpy(), keep)]
+        if not resample:
+            frame = as_alignment(offset).apply(chunk['frame'].to_numpy()).astype(np.int64)
+            yield _rows_dict(frame, chunk, index, identities, name)
+            continue
+
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        else:
+            chunk = chunk.reset_index(drop=True)
+        if len(chunk) == 0:
+            continue
+        source = chunk['frame'].to_numpy()
+        carry = chunk[source == source[-1]]
+        frame, rows, next_rows, weight = resample_rows(source, chunk['tracking_id'].to_numpy(), offset)
+        body = source[rows] < source[-1]
+        yield _rows_dict(frame[body], chunk, index, identities, name, rows[body], next_rows[body], weight[body])
+
+    if carry is not None and len(carry):
+        chunk = carry.reset_index(drop=True)
+        frame, rows, next_rows, weight = resample_rows(chunk['frame'].to_numpy(), chunk['tracking_id'].to_numpy(),
+                                                       offset)
+        yield _rows_dict(frame, chunk, index, identities, name, rows, next_rows, weight)
+
+
+def _split(rows, bound):
+    """(rows with frame < bound, the rest); rows are frame-ordered"""
+    cut = int(np.searchsorted(rows['frame'], bound))
+    return {c: v[:cut] for c, v in rows.items()}, {c: v[cut:] for c, v in rows.items()}
+
+
+def fuse_rows(rows):
+    """One record per (frame, global_id): positions and velocity averaged
+    over the cameras that saw it, the known team kept"""
+    order = np.lexsort((rows['global_id'], rows['frame']))
+    frame, gid = rows['frame'][order], rows['global_id'][order]
+    starts = np.flatnonzero(np.concatenate([[True], (np.diff(frame) != 0) | (np.diff(gid) != 0)]))
+    counts = np.diff(np.append(starts, len(order)))
+
+    fused = np.empty(len(starts), dtype=STITCHED_DTYPE)
+    fused['frame'] = frame[starts]
+    fused['global_id'] = gid[starts]
+    fused['team_id'] = np.maximum.reduceat(rows['team_id'][order], starts)
+    for column in ('pitch_x', 'pitch_y', 'velocity'):
+        fused[column] = np.add.reduceat(rows[column][order], starts) / counts
+    # Cameras are bits of a mask, so duplicates from one camera count once
+    mask = np.bitwise_or.reduceat(rows['camera'][order], starts)
+    fused['n_cameras'] = sum((mask >> bit) & 1 for bit in range(int(mask.max()).bit_length())) if len(mask) else 0
+    return fused
+
+
+def merge_by_frame(streams):
+    """k-way merge of frame-ordered chunk streams into fused, frame-ordered blocks
+
+    Frames below the smallest last frame buffered by any unfinished stream
+    are complete in every camera and are emitted; the rest waits for the
+    next chunk. Memory is about one chunk per camera.
+    """
+    streams = list(streams)
+    buffers = [None] * len(streams)
+    done = [False] * len(streams)
+
+    def pull(i):
+        chunk = next(streams[i], None)
+        if chunk is None:
+            done[i] = True
+        elif buffers[i] is None:
+            buffers[i] = chunk
+        else:
+            buffers[i] = {c: np.concatenate([buffers[i][c], chunk[c]]) for c in chunk}
+
+    while True:
+        for i in range(len(streams)):
+            while not done[i] and (buffers[i] is None or len(buffers[i]['frame']) == 0):
+                pull(i)
+        # An offset can map the first frame of a stream's next chunk onto the
+        # last frame of this one, so that frame waits until the next pull
+        open_ends = [int(buffers[i]['frame'][-1]) for i in range(len(streams)) if not done[i]]
+        bound = min(open_ends) if open_ends else np.iinfo(np.int64).max
+
+        ready = []
+        for i, rows in enumerate(buffers):
+            if rows is not None and len(rows['frame']):
+                head, buffers[i] = _split(rows, bound)
+                if len(head['frame']):
+                    ready.append(head)
+        if ready:
+            yield fuse_rows({c: np.concatenate([r[c] for r in ready]) for c in ready[0]})
+        elif open_ends:
+            # Every buffered frame is at the bound: read on in the stream holding it
+            pull(next(i for i in range(len(streams)) if not done[i] and int(buffers[i]['frame'][-1]) == bound))
+        else:
+            return
+
+
+def _linking_rows(data, offset, keep, x_ranges):
+    """What link_identities needs from one camera: (band rows, track spans)
+
+    Only the rows inside the camera's overlap bands are copied out of the
+    memory-mapped columns; spans are computed from the frame and id columns
+    and restricted to the kept tracks.
+    """
+    tracking_id = np.asarray(data['tracking_id'])
+    spans = track_spans(tracking_id, data['frame'], offset)
+    if keep is not None:
+        kept = set(np.asarray(keep).tolist())
+        spans = {track_id: span for track_id, span in spans.items() if track_id in kept}
+
+    x = np.asarray(data['pitch_x'])
+    mask = np.zeros(len(x), dtype=bool)
+    for x_range in x_ranges:
+        mask |= (x >= x_range[0]) & (x <= x_range[1])
+    if keep is not None:
+        mask &= np.isin(tracking_id, keep)
+    columns = [c for c in ('frame', 'tracking_id', 'team_id', 'pitch_x', 'pitch_y') if c in data.columns]
+    return pd.DataFrame({c: np.asarray(data[c])[mask] for c in columns}), spans
+
+
+@timed()
+def write_stitched(paths, offsets, pairs, output_stem, formats=('bin', 'csv'), chunk_rows=CHUNK_ROWS,
+                   radius=10.0, window=50, min_support=10, min_windows=2, tracks=None, subframe=False):
+    """Write one synced, de-duplicated, pitch-wide tracking file for a match
+
+    paths: {name: csv_path}; offsets: {name: constant or frame -> offset
+    callable} on the reference clock; pairs: [(name_a, name_b,
+    overlap_x_range), ...]. Identities are linked from the overlap bands
+    (stitching.link_identities); the rows are then streamed from every
+    camera and merged by frame. tracks: optional {name: tracking ids to
+    keep}, e.g. the tracks that passed track_quality.
+
+    Cameras with a fractional constant offset (or every shifted camera with
+    subframe=True) are resampled onto the integer reference frames by
+    linear interpolation along each track instead of rounding their frames.
+
+    Writes output_stem + '.bin' (STITCHED_DTYPE records, frame-ordered, with
+    a .json header) and/or '.csv'. Returns the header dict.
+    """
+    tracks = tracks or {}
+    bands, spans = {}, {}
+    for name, path in paths.items():
+        bands[name], spans[name] = _linking_rows(load_tracks(path), offsets.get(name, 0), tracks.get(name),
+                                                 [x_range for a, b, x_range in pairs if name in (a, b)])
+    identities, links = link_identities(bands, offsets, pairs, radius, window, min_support, min_windows,
+                                        spans=spans)
+    del bands
+
+    def resampled(offset):
+        if hasattr(offset, 'apply'):
+            # time_align alignments map to whole frames themselves
+            return False
+        if callable(offset):
+            return subframe
+        return subframe and offset != 0 or float(offset) != int(offset)
+
+    streams = [_camera_chunks(path, i, offsets.get(name, 0), identities, name, chunk_rows, tracks.get(name),
+                              resampled(offsets.get(name, 0)))
+               for i, (name, path) in enumerate(paths.items())]
+
+    rows = 0
+    first = last = None
+    binary = open(output_stem + '.bin', 'wb') if 'bin' in formats else None
+    header = True
+    try:
+        for block in merge_by_frame(streams):
+            if binary is not None:
+                block.tofile(binary)
+            if 'csv' in formats:
+                pd.DataFrame(block).to_csv(output_stem + '.csv', mode='w' if header else 'a',
+                                           header=header, index=False)
+                header = False
+            rows += len(block)
+            first = int(block['frame'][0]) if first is None else first
+            last = int(block['frame'][-1])
+    finally:
+        if binary is not None:
+            binary.close()
+    if 'csv' in formats and header:
+        pd.DataFrame(np.empty(0, dtype=STITCHED_DTYPE)).to_csv(output_stem + '.csv', index=False)
+
+    meta = {
+        'rows': rows,
+        'first_frame': first,
+        'last_frame': last,
+        'dtype': [[name, STITCHED_DTYPE[name].str] for name in STITCHED_DTYPE.names],
+        'cameras': {name: os.path.abspath(path) for name, path in paths.items()},
+        'offsets': {name: repr(offset) if callable(offset) or hasattr(offset, 'apply') else
+                    (int(offset) if float(offset).is_integer() else float(offset)) for name, offset in offsets.items()},
+        'global_ids': int(max((ids.max() + 1 for _, ids in identities.values() if len(ids)), default=0)),
+        'links': int(links['linked'].sum())
+    }
+    if binary is not None:
+        with open(output_stem + '.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+    return meta
+
+
+def read_stitched(output_stem, mmap=True):
+    """Memory-mapped DataFrame over a stitched .bin file"""
+    with open(output_stem + '.json') as f:
+        meta = json.load(f)
+    dtype = np.dtype([(name, code) for name, code in meta['dtype']])
+    if meta['rows'] == 0:
+        records = np.empty(0, dtype=dtype)
+    elif mmap:
+        records = np.memmap(output_stem + '.bin', dtype=dtype, mode='c', shape=(meta['rows'],))
+    else:
+        records = np.fromfile(output_stem + '.bin', dtype=dtype)
+    return pd.DataFrame({name: records[name] for name in dtype.names}, copy=False)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from joint_sync import CAMERA_ORDER, match_paths, neighbour_pairs, joint_sync
+    from overlap_region import detect_overlaps
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(current_dir), 'data')
+    match = sys.argv[2] if len(sys.argv) > 2 else '1'
+
+    paths = {name: path for name, path in match_paths(data_dir, match).items() if os.path.exists(path)}
+    names = [n for n in CAMERA_ORDER if n in paths]
+    regions = detect_overlaps(paths, neighbour_pairs(names))
+    offsets, _, _ = joint_sync({n: load_tracks(paths[n]) for n in names}, names, regions=regions)
+    print(f"Offsets: {offsets}")
+
+    # Identities are linked between neighbouring cameras only
+    pairs = [(a, b, regions[a, b]['x_range']) for a, b in neighbour_pairs(names, reach=1) if regions.get((a, b))]
+    start = time.perf_counter()
+    meta = write_stitched(paths, offsets, pairs, os.path.join(data_dir, f'stitched_{match}'))
+    print(f"Wrote {meta['rows']} rows ({meta['global_ids']} global ids, frames "
+          f"{meta['first_frame']}-{meta['last_frame']}) in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,261 @@
+import pandas as pd
+import numpy as np
+import os
+from scipy.optimize import linear_sum_assignment
+from time_align import as_alignment
+from spatial_index import FrameGridIndex
+from track_cache import load_tracks
+from instrument import timed
+
+
+def _band_rows(data, overlap_x_range, offset):
+    """Overlap-band rows of a camera with frames on the reference clock"""
+    x = np.asarray(data['pitch_x'])
+    keep = (x >= overlap_x_range[0]) & (x <= overlap_x_range[1])
+    return {
+        'frame': as_alignment(offset).apply(np.asarray(data['frame'])[keep]).astype(np.int64),
+        'tracking_id': np.asarray(data['tracking_id'])[keep],
+        'team_id': np.asarray(data['team_id'])[keep] if 'team_id' in data.columns else np.full(keep.sum(), -1),
+        'xy': np.column_stack([x[keep], np.asarray(data['pitch_y'])[keep]]).astype(np.float64)
+    }
+
+
+def colocated_pairs(rows_a, rows_b, radius):
+    """All (i, j, distance) with a and b points in the same frame within radius
+
+    b is bucketed into a per-frame pitch grid (spatial_index) so each point
+    of a only looks at the few cells around it in its own frame.
+    """
+    if len(rows_a['frame']) == 0 or len(rows_b['frame']) == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    index = FrameGridIndex(rows_b['xy'][:, 0], rows_b['xy'][:, 1], rows_b['frame'], cell=2 * radius)
+    return index.query_pairs(rows_a['xy'][:, 0], rows_a['xy'][:, 1], rows_a['frame'], radius)
+
+
+def associate_tracks(data_a, data_b, overlap_x_range, offset_a=0, offset_b=0, radius=10.0,
+                     window=50, min_support=10):
+    """Match tracks of two cameras inside their overlap band
+
+    Co-located points are grouped per (window, track_a, track_b); pairs seen in
+    fewer than min_support frames of a window are dropped, and each window is
+    solved as an assignment problem on the mean distance. Tracks with
+    different known teams (team_id >= 0) are never paired.
+
+    Returns a DataFrame with one row per matched pair per window:
+    window, track_a, track_b, cost, support.
+    """
+    rows_a = _band_rows(data_a, overlap_x_range, offset_a)
+    rows_b = _band_rows(data_b, overlap_x_range, offset_b)
+    i, j, dist = colocated_pairs(rows_a, rows_b, radius)
+
+    team_a, team_b = rows_a['team_id'][i], rows_b['team_id'][j]
+    same_team = (team_a == team_b) | (team_a < 0) | (team_b < 0)
+    i, j, dist = i[same_team], j[same_team], dist[same_team]
+
+    pairs = pd.DataFrame({
+        'window': rows_a['frame'][i] // window,
+        'track_a': rows_a['tracking_id'][i],
+        'track_b': rows_b['tracking_id'][j],
+        'dist': dist
+    })
+    scores = pairs.groupby(['window', 'track_a', 'track_b'], sort=True)['dist'].agg(['mean', 'size'])
+    scores = scores[scores['size'] >= min_support].reset_index()
+
+    matches = []
+    for window_id, group in scores.groupby('window', sort=False):
+        tracks_a, ia = np.unique(group['track_a'].to_numpy(), return_inverse=True)
+        tracks_b, ib = np.unique(group['track_b'].to_numpy(), return_inverse=True)
+        cost = np.full((len(tracks_a), len(tracks_b)), radius * 10.0)
+        cost[ia, ib] = group['mean'].to_numpy()
+        support = np.zeros_like(cost, dtype=np.int64)
+        support[ia, ib] = group['size'].to_numpy()
+
+        rows, cols = linear_sum_assignment(cost)
+        valid = support[rows, cols] > 0
+        for r, c in zip(rows[valid], cols[valid]):
+            matches.append((window_id, tracks_a[r], tracks_b[c], cost[r, c], support[r, c]))
+
+    return pd.DataFrame(matches, columns=['window', 'track_a', 'track_b', 'cost', 'support'])
+
+
+class _Identities:
+    """Union-find over (camera, tracking_id) that refuses merges which would
+    put two tracks of the same camera that exist at the same time together"""
+
+    def __init__(self, spans):
+        self.parent = {}
+        self.members = {}
+        self.spans = spans
+
+    def find(self, node):
+        self.parent.setdefault(node, node)
+        self.members.setdefault(node, [node])
+        root = node
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[node] != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def _conflict(self, root_a, root_b):
+        for cam_a, track_a in self.members[root_a]:
+            start_a, end_a = self.spans[cam_a, track_a]
+            for cam_b, track_b in self.members[root_b]:
+                if cam_a != cam_b:
+                    continue
+                start_b, end_b = self.spans[cam_b, track_b]
+                if start_a <= end_b and start_b <= end_a:
+                    return True
+        return False
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b or self._conflict(root_a, root_b):
+            return False
+        if len(self.members[root_a]) < len(self.members[root_b]):
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.members[root_a].extend(self.members.pop(root_b))
+        return True
+
+
+def track_spans(tracking_id, frame, offset=0):
+    """{tracking_id: (first_frame, last_frame)} on the reference clock"""
+    frame = as_alignment(offset).apply(np.asarray(frame)).astype(np.int64)
+    span = pd.DataFrame({'id': np.asarray(tracking_id), 'frame': frame}).groupby('id')['frame'].agg(['min', 'max'])
+    return {track_id: (start, end) for track_id, start, end in span.itertuples()}
+
+
+@timed()
+def link_identities(cameras, offsets, pairs, radius=10.0, window=50, min_support=10, min_windows=2,
+                    spans=None):
+    """Global player identities across several synced cameras
+
+    Track pairs matched (associate_tracks) in at least min_windows windows
+    are linked, strongest first, unless that would join two tracks of one
+    camera that exist at the same time.
+
+    spans: optional {name: track_spans(...)} computed by the caller; cameras
+    then only need the rows inside the overlap bands of pairs.
+
+    Returns (identities, links): identities is {name: (tracking_ids,
+    global_ids)} with sorted tracking ids, links has one row per candidate
+    track pair and whether it was linked.
+    """
+    if spans is None:
+        spans = {name: track_spans(data['tracking_id'], data['frame'], offsets.get(name))
+                 for name, data in cameras.items()}
+    spans = {(name, track_id): span for name, camera_spans in spans.items()
+             for track_id, span in camera_spans.items()}
+
+    all_links = []
+    for name_a, name_b, overlap_x_range in pairs:
+        matches = associate_tracks(cameras[name_a], cameras[name_b], overlap_x_range,
+                                   offsets.get(name_a, 0), offsets.get(name_b, 0),
+                                   radius, window, min_support)
+        if matches.empty:
+            continue
+        links = matches.groupby(['track_a', 'track_b']).agg(
+            windows=('window', 'size'), support=('support', 'sum'), cost=('cost', 'mean')
+        ).reset_index()
+        links.insert(0, 'camera_b', name_b)
+        links.insert(0, 'camera_a', name_a)
+        all_links.append(links[links['windows'] >= min_windows])
+
+    links = pd.concat(all_links, ignore_index=True) if all_links else pd.DataFrame(
+        columns=['camera_a', 'camera_b', 'track_a', 'track_b', 'windows', 'support', 'cost'])
+    links = links.sort_values(['support', 'cost'], ascending=[False, True], ignore_index=True)
+
+    union = _Identities(spans)
+    links['linked'] = [
+        union.union((row.camera_a, row.track_a), (row.camera_b, row.track_b))
+        for row in links.itertuples()
+    ]
+
+    # Number the identities in camera order
+    root_ids = {}
+    identities = {}
+    for name in cameras:
+        track_ids = np.array(sorted(track_id for cam, track_id in spans if cam == name))
+        identities[name] = (track_ids, np.array([
+            root_ids.setdefault(union.find((name, track_id)), len(root_ids))
+            for track_id in track_ids.tolist()
+        ], dtype=np.int64))
+
+    return identities, links
+
+
+def global_ids(identities, name, tracking_ids):
+    """Map a camera's tracking ids to global ids (-1 for unknown tracks)"""
+    track_ids, ids = identities[name]
+    tracking_ids = np.asarray(tracking_ids)
+    position = np.clip(np.searchsorted(track_ids, tracking_ids), 0, max(len(track_ids) - 1, 0))
+    known = (track_ids[position] == tracking_ids) if len(track_ids) else np.zeros(len(tracking_ids), dtype=bool)
+    return np.where(known, ids[position] if len(ids) else -1, -1)
+
+
+def stitch_cameras(cameras, offsets, pairs, radius=10.0, window=50, min_support=10, min_windows=2):
+    """Merge several synced cameras into one table of global player identities
+
+    cameras: {name: DataFrame}; offsets: {name: constant or frame -> offset
+    callable, remapping table or time_align alignment} relative to the
+    reference clock (0 for the reference camera); pairs: [(name_a, name_b,
+    overlap_x_range), ...] for neighbouring cameras. Cameras may also be
+    time_align.AlignedView objects already on the reference clock, with
+    offsets left empty.
+
+    Returns (merged, links): merged has one row per global_id and frame with
+    positions averaged over the cameras that saw it. For full matches
+    written to disk see stitch_writer, which streams the same merge.
+    """
+    identities, links = link_identities(cameras, offsets, pairs, radius, window, min_support, min_windows)
+
+    # Fuse rows that share (global_id, frame)
+    parts = []
+    for name, data in cameras.items():
+        part = pd.DataFrame({
+            'frame': as_alignment(offsets.get(name)).apply(np.asarray(data['frame'])).astype(np.int64),
+            'global_id': global_ids(identities, name, data['tracking_id']),
+            'team_id': np.asarray(data['team_id']) if 'team_id' in data.columns else -1,
+            'pitch_x': np.asarray(data['pitch_x'], dtype=np.float64),
+            'pitch_y': np.asarray(data['pitch_y'], dtype=np.float64),
+            'camera': name
+        })
+        parts.append(part)
+
+    rows = pd.concat(parts, ignore_index=True)
+    merged = rows.groupby(['frame', 'global_id'], sort=True).agg(
+        team_id=('team_id', 'max'),
+        pitch_x=('pitch_x', 'mean'),
+        pitch_y=('pitch_y', 'mean'),
+        n_cameras=('camera', 'nunique')
+    ).reset_index()
+
+    return merged, links
+
+
+if __name__ == "__main__":
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+
+    from sync_estimator import estimate_sync_offset
+    from overlap_region import detect_overlaps
+
+    print("Loading data...")
+    paths = {'L': os.path.join(data_dir, 'camL_1.csv'), 'R': os.path.join(data_dir, 'camR_1.csv')}
+    left_data = load_tracks(paths['L'])
+    right_data = load_tracks(paths['R'])
+
+    region = detect_overlaps(paths, [('L', 'R')])['L', 'R']
+    overlap_x_range = region['x_range'] if region else (463, 619)
+    print(f"Overlap band: x {overlap_x_range[0]:.0f}-{overlap_x_range[1]:.0f}")
+    offset = estimate_sync_offset(left_data, right_data, overlap_x_range)['offset']
+    print(f"Sync offset: {offset} frames")
+
+    merged, links = stitch_cameras(
+        {'L': left_data, 'R': right_data},
+        {'L': 0, 'R': offset},
+        [('L', 'R', overlap_x_range)]
+    )
+    print(f"\nLinked {links['linked'].sum()} of {len(links)} candidate track pairs")
+    print(f"Merged table: {len(merged)} rows, {merged['global_id'].nunique()} global ids")
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+import os
+from sync_estimator import overlap_rows, estimate_sync_offset
+from spatial_index import FrameGridIndex
+from track_cache import load_tracks
+
+# Columns carried through resampling; the rest are taken from the earlier row
+INTERPOLATED_COLUMNS = ('pitch_x', 'pitch_y', 'velocity')
+
+
+def successor_rows(frame, tracking_id):
+    """(rows, next_rows): each row paired with the same track's row one frame later"""
+    frame = np.asarray(frame, dtype=np.int64)
+    tracking_id = np.asarray(tracking_id)
+    order = np.lexsort((frame, tracking_id))
+    f, t = frame[order], tracking_id[order]
+    consecutive = (t[1:] == t[:-1]) & (f[1:] == f[:-1] + 1)
+    return order[:-1][consecutive], order[1:][consecutive]
+
+
+def _reference_time(frame, offset):
+    """Continuous reference-clock time of camera frames (offset as in align_frames)"""
+    frame = np.asarray(frame, dtype=np.float64)
+    if not callable(offset):
+        return frame - offset
+    reference = frame - offset(frame)
+    return frame - offset(reference)
+
+
+def resample_rows(frame, tracking_id, offset, eps=1e-6):
+    """Interpolation plan putting a camera's rows on the integer reference grid
+
+    Each pair of consecutive frames of a track spans reference times
+    [r0, r1); an integer grid frame g in that span is placed at weight
+    w = (g - r0) / (r1 - r0) between the two rows. Rows whose own reference
+    time is already an integer are kept as they are (w = 0), so an integer
+    offset reproduces align_frames exactly.
+
+    Returns (grid_frame, rows, next_rows, weight); values are
+    (1 - weight) * column[rows] + weight * column[next_rows].
+    """
+    reference = _reference_time(frame, offset)
+    rows, next_rows = successor_rows(frame, tracking_id)
+    r0, r1 = reference[rows], reference[next_rows]
+    grid = np.ceil(r0 - eps)
+    inside = (grid < r1 - eps) & (grid > r0 + eps)
+
+    # Rows sitting on the grid, including the last row of each track
+    exact = np.flatnonzero(np.abs(reference - np.rint(reference)) <= eps)
+    grid_frame = np.concatenate([np.rint(reference[exact]), grid[inside]]).astype(np.int64)
+    start = np.concatenate([exact, rows[inside]])
+    end = np.concatenate([exact, next_rows[inside]])
+    weight = np.concatenate([np.zeros(len(exact)), ((grid - r0) / (r1 - r0))[inside]])
+
+    order = np.lexsort((np.asarray(tracking_id)[start], grid_frame))
+    return grid_frame[order], start[order], end[order], weight[order]
+
+
+def resample_tracks(data, offset):
+    """A camera's rows linearly interpolated onto integer reference frames
+
+    frame becomes the reference frame and positions (and velocity) are
+    interpolated along each track; other columns come from the earlier row.
+    """
+    grid_frame, rows, next_rows, weight = resample_rows(data['frame'], data['tracking_id'], offset)
+    columns = {}
+    for name in data.columns:
+        values = np.asarray(data[name])
+        if name == 'frame':
+            columns[name] = grid_frame
+        elif name in INTERPOLATED_COLUMNS:
+            columns[name] = (1 - weight) * values[rows] + weight * values[next_rows]
+        else:
+            columns[name] = values[rows]
+    return pd.DataFrame(columns)
+
+
+def _interpolated_points(right, rows, next_rows, offset):
+    """Right-camera positions at time left frame + offset, keyed by left frame"""
+    n = int(np.floor(offset))
+    w = offset - n
+    xy_a, xy_b = right['xy'][rows], right['xy'][next_rows]
+    return right['frame'][rows] - n, xy_a, xy_b - xy_a, (1 - w) * xy_a + w * xy_b
+
+
+def spatial_subframe_offset(left_data, right_data, offset, overlap_x_range=(290, 320), radius=5.0,
+                            iterations=4, max_points=200_000):
+    """Refine a lag to a fraction of a frame by matching interpolated positions
+
+    Right-camera tracks are interpolated linearly between consecutive frames
+    at time f + offset for every left frame f. Each left point in the band is
+    paired with the nearest interpolated right point within radius; the sum
+    of squared distances is quadratic in the fractional part of the offset,
+    so the best one is solved in closed form and the pairing is redone
+    around it. Moving players carry the weight (a still player says nothing
+    about timing).
+
+    Returns a dict with offset, rms distance and the number of pairs used.
+    """
+    left_mask = overlap_rows(left_data, overlap_x_range)
+    left_frame = np.asarray(left_data['frame'])[left_mask].astype(np.int64)
+    left_xy = np.column_stack([np.asarray(left_data['pitch_x'])[left_mask],
+                               np.asarray(left_data['pitch_y'])[left_mask]]).astype(np.float64)
+    if len(left_frame) > max_points:
+        keep = np.linspace(0, len(left_frame) - 1, max_points).astype(np.int64)
+        left_frame, left_xy = left_frame[keep], left_xy[keep]
+
+    # A margin keeps right points that move into the band between frames
+    wide = (overlap_x_range[0] - radius, overlap_x_range[1] + radius)
+    right_mask = overlap_rows(right_data, wide)
+    right = {
+        'frame': np.asarray(right_data['frame'])[right_mask].astype(np.int64),
+        'xy': np.column_stack([np.asarray(right_data['pitch_x'])[right_mask],
+                               np.asarray(right_data['pitch_y'])[right_mask]]).astype(np.float64)
+    }
+    rows, next_rows = successor_rows(right['frame'], np.asarray(right_data['tracking_id'])[right_mask])
+
+    estimate = float(offset)
+    result = {'offset': estimate, 'rms': np.nan, 'pairs': 0}
+    for _ in range(iterations):
+        key, start, step, points = _interpolated_points(right, rows, next_rows, estimate)
+        index = FrameGridIndex(points[:, 0], points[:, 1], key, cell=2 * radius)
+        query, point, dist = index.query_pairs(left_xy[:, 0], left_xy[:, 1], left_frame, radius)
+        if len(query) == 0:
+            break
+        # Nearest interpolated point per left point
+        order = np.lexsort((dist, query))
+        first = np.concatenate([[True], query[order][1:] != query[order][:-1]])
+        query, point = query[order][first], point[order][first]
+
+        # |start + w * step - left|^2 summed over pairs is minimal at w below
+        v = step[point]
+        d = left_xy[query] - start[point]
+        energy = (v * v).sum()
+        if energy <= 0:
+            break
+        n = np.floor(estimate)
+        w = np.clip((d * v).sum() / energy, -1.0, 2.0)
+        residual = d - w * v
+        previous, estimate = estimate, float(n + w)
+        result = {'offset': estimate, 'rms': float(np.sqrt((residual ** 2).sum(axis=1).mean())),
+                  'pairs': int(len(query))}
+        if abs(estimate - previous) < 1e-3:
+            break
+    return result
+
+
+def subframe_offset(left_data, right_data, overlap_x_range=(290, 320), lag_window=None, radius=5.0):
+    """Integer lag by cross-correlation, refined to sub-frame precision
+
+    The correlation peak gives the integer lag and a parabola-fit estimate;
+    spatial_subframe_offset then refines it on the track positions. Offsets
+    follow the match_overlap convention (right frame = left frame + offset).
+    """
+    coarse = estimate_sync_offset(left_data, right_data, overlap_x_range, lag_window)
+    fine = spatial_subframe_offset(left_data, right_data, coarse['subframe_offset'], overlap_x_range, radius)
+    return {
+        'offset': fine['offset'],
+        'integer_offset': coarse['offset'],
+        'parabolic_offset': coarse['subframe_offset'],
+        'confidence': coarse['confidence'],
+        'rms': fine['rms'],
+        'pairs': fine['pairs']
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+
+    print("Loading data...")
+    left_data = load_tracks(os.path.join(data_dir, 'camL_1.csv'))
+    right_data = load_tracks(os.path.join(data_dir, 'camR_1.csv'))
+
+    start = time.perf_counter()
+    coarse = estimate_sync_offset(left_data, right_data, (463, 619))
+    integer_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fine = spatial_subframe_offset(left_data, right_data, coarse['subframe_offset'], (463, 619))
+    refine_seconds = time.perf_counter() - start
+
+    print(f"Integer lag:     {coarse['offset']} ({integer_seconds:.2f} s)")
+    print(f"Parabolic fit:   {coarse['subframe_offset']:.3f}")
+    print(f"Spatial refine:  {fine['offset']:.3f} (rms {fine['rms']:.2f}, {fine['pairs']} pairs, "
+          f"{refine_seconds:.2f} s)")
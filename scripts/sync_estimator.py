@@ -0,0 +1,187 @@
+import numpy as np
+from scipy.fft import next_fast_len, rfft, irfft
+from instrument import timed
+
+
+def overlap_rows(data, overlap_x_range):
+    """Boolean mask of rows that fall inside the overlap x band"""
+    x = np.asarray(data['pitch_x'])
+    return (x >= overlap_x_range[0]) & (x <= overlap_x_range[1])
+
+
+def overlap_signals(data, frame_start, n_frames, overlap_x_range=(290, 320),
+                    y_range=(0, 700), y_bins=8, teams=(1, 2)):
+    """Dense per-frame channels describing the overlap strip
+
+    Returns a float32 array of shape (n_channels, n_frames) where column i is
+    frame frame_start + i. Channels are, in order:
+        - occupancy of each of the y_bins cells along pitch_y
+        - point count per team in teams
+        - mean velocity of the points in the strip (if a velocity column exists)
+    """
+    mask = overlap_rows(data, overlap_x_range)
+    frame = np.asarray(data['frame'])[mask].astype(np.int64) - frame_start
+    in_range = (frame >= 0) & (frame < n_frames)
+    mask_idx = np.flatnonzero(mask)[in_range]
+    frame = frame[in_range]
+
+    channels = []
+
+    # Occupancy along pitch_y
+    y = np.asarray(data['pitch_y'], dtype=np.float64)[mask_idx]
+    cell = ((y - y_range[0]) / (y_range[1] - y_range[0]) * y_bins).astype(np.int64)
+    cell = np.clip(cell, 0, y_bins - 1)
+    occupancy = np.bincount(cell * n_frames + frame, minlength=y_bins * n_frames)
+    channels.append(occupancy.reshape(y_bins, n_frames))
+
+    # Team-split counts
+    if 'team_id' in data.columns and len(teams) > 0:
+        team = np.asarray(data['team_id'])[mask_idx]
+        for team_id in teams:
+            channels.append(np.bincount(frame[team == team_id], minlength=n_frames)[None, :])
+
+    # Mean velocity in the strip
+    if 'velocity' in data.columns:
+        velocity = np.nan_to_num(np.asarray(data['velocity'], dtype=np.float64)[mask_idx])
+        total = np.bincount(frame, weights=velocity, minlength=n_frames)
+        count = np.bincount(frame, minlength=n_frames)
+        channels.append((total / np.maximum(count, 1))[None, :])
+
+    return np.vstack(channels).astype(np.float32)
+
+
+def channel_layout(left_data, right_data, left_mask, right_mask):
+    """Shared y cells and team channels so both cameras' channels line up"""
+    y = np.concatenate([
+        np.asarray(left_data['pitch_y'])[left_mask],
+        np.asarray(right_data['pitch_y'])[right_mask]
+    ])
+    y_range = (float(y.min()), float(y.max()) + 1e-6)
+
+    teams = []
+    if 'team_id' in left_data.columns and 'team_id' in right_data.columns:
+        teams = [int(t) for t in np.intersect1d(
+            np.asarray(left_data['team_id'])[left_mask],
+            np.asarray(right_data['team_id'])[right_mask]
+        ) if t >= 0]
+
+    return y_range, teams
+
+
+def standardize(signals):
+    """Zero-mean, unit-variance per channel (flat channels become zero)"""
+    signals = signals - signals.mean(axis=1, keepdims=True)
+    std = signals.std(axis=1, keepdims=True)
+    return np.divide(signals, std, out=np.zeros_like(signals), where=std > 0)
+
+
+def correlate_signals(left_signals, right_signals):
+    """Summed FFT cross-correlation of all channels
+
+    Returns (shifts, correlation) where correlation[i] is
+    sum_c sum_n left[c, n] * right[c, n + shifts[i]].
+    """
+    n_left = left_signals.shape[1]
+    n_right = right_signals.shape[1]
+    n_fft = next_fast_len(n_left + n_right - 1, real=True)
+
+    spectrum = np.zeros(n_fft // 2 + 1, dtype=np.complex128)
+    for left, right in zip(left_signals, right_signals):
+        spectrum += np.conj(rfft(left, n_fft)) * rfft(right, n_fft)
+    circular = irfft(spectrum, n_fft)
+
+    # Reorder the circular result into shifts -(n_left - 1) .. n_right - 1
+    shifts = np.arange(-(n_left - 1), n_right)
+    return shifts, circular[shifts % n_fft]
+
+
+def peak_sharpness(correlation, peak, exclusion=25):
+    """Peak-to-sidelobe ratio: how many sidelobe std-devs the peak stands out"""
+    side = np.ones(len(correlation), dtype=bool)
+    side[max(peak - exclusion, 0):peak + exclusion + 1] = False
+    if side.sum() < 2:
+        return 0.0
+    sidelobes = correlation[side]
+    std = sidelobes.std()
+    if std == 0:
+        return 0.0
+    return float((correlation[peak] - sidelobes.mean()) / std)
+
+
+def parabolic_peak(correlation, peak):
+    """Fractional shift (-0.5 .. 0.5) of the true maximum from sample peak
+
+    Fits a parabola through the peak and its two neighbours; edge peaks and
+    flat tops get 0.
+    """
+    if peak <= 0 or peak >= len(correlation) - 1:
+        return 0.0
+    before, at, after = (float(v) for v in correlation[peak - 1:peak + 2])
+    curvature = before - 2 * at + after
+    if curvature >= 0:
+        return 0.0
+    return float(np.clip(0.5 * (before - after) / curvature, -0.5, 0.5))
+
+
+@timed()
+def estimate_sync_offset(left_data, right_data, overlap_x_range=(290, 320), lag_window=None,
+                         y_bins=8, teams=None):
+    """Estimate the frame offset between two cameras from several overlap channels
+
+    The offset follows the match_overlap convention: the right camera shows
+    the event seen by the left camera at frame f at frame f + offset, so
+    right frames are aligned by subtracting the offset.
+
+    Returns a dict with the offset, a sub-frame offset from a parabola fit
+    at the peak, a correlation coefficient at the peak, a peak-to-sidelobe
+    confidence score and the full lag/correlation curve.
+    """
+    left_mask = overlap_rows(left_data, overlap_x_range)
+    right_mask = overlap_rows(right_data, overlap_x_range)
+    left_frames = np.asarray(left_data['frame'])[left_mask]
+    right_frames = np.asarray(right_data['frame'])[right_mask]
+    if len(left_frames) == 0 or len(right_frames) == 0:
+        raise ValueError("No rows in the overlap region for one of the cameras")
+
+    y_range, shared_teams = channel_layout(left_data, right_data, left_mask, right_mask)
+    if teams is None:
+        teams = shared_teams
+
+    left_start = int(left_frames.min())
+    right_start = int(right_frames.min())
+    left_signals = overlap_signals(left_data, left_start, int(left_frames.max()) - left_start + 1,
+                                   overlap_x_range, y_range, y_bins, teams)
+    right_signals = overlap_signals(right_data, right_start, int(right_frames.max()) - right_start + 1,
+                                    overlap_x_range, y_range, y_bins, teams)
+
+    return estimate_from_signals(
+        standardize(left_signals), left_start,
+        standardize(right_signals), right_start,
+        lag_window
+    )
+
+
+def estimate_from_signals(left_signals, left_start, right_signals, right_start, lag_window=None):
+    """Correlate precomputed (standardized) channel arrays and pick the best lag"""
+    shifts, correlation = correlate_signals(left_signals, right_signals)
+    lags = shifts + (right_start - left_start)
+
+    if lag_window is not None:
+        keep = (lags >= lag_window[0]) & (lags < lag_window[1])
+        lags = lags[keep]
+        correlation = correlation[keep]
+    if len(lags) == 0:
+        raise ValueError("Lag window does not overlap the recorded frames")
+
+    peak = int(np.argmax(correlation))
+    energy = np.sqrt((left_signals.astype(np.float64) ** 2).sum() *
+                     (right_signals.astype(np.float64) ** 2).sum())
+
+    return {
+        'offset': int(lags[peak]),
+        'subframe_offset': float(lags[peak]) + parabolic_peak(correlation, peak),
+        'peak_correlation': float(correlation[peak] / energy) if energy > 0 else 0.0,
+        'confidence': peak_sharpness(correlation, peak),
+        'lags': lags,
+        'correlation': correlation
+    }
@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+from drift_sync import align_frames
+
+
+class FrameShift:
+    """Camera frames to reference frames by subtracting an offset
+
+    offset is a constant or a frame -> offset callable such as
+    PiecewiseOffset, in the match_overlap convention (see align_frames).
+    """
+
+    def __init__(self, offset=0):
+        self.offset = offset
+
+    def apply(self, frames):
+        frames = np.asarray(frames)
+        if not callable(self.offset) and self.offset == 0:
+            return frames
+        return align_frames(frames, self.offset)
+
+    def then(self, other):
+        """This mapping followed by other (camera -> this clock -> other's clock)"""
+        other = as_alignment(other)
+        if isinstance(other, FrameShift) and not callable(self.offset) and not callable(other.offset):
+            return FrameShift(self.offset + other.offset)
+        return ComposedAlignment([self, other])
+
+    def __repr__(self):
+        return f"FrameShift({self.offset!r})"
+
+
+class FrameMap:
+    """Camera frames to reference frames through a remapping table
+
+    source_frames -> target_frames, e.g. a DTW path. Frames between table
+    entries are interpolated and frames outside it keep the offset of the
+    nearest entry; results are rounded to whole frames.
+    """
+
+    def __init__(self, source_frames, target_frames):
+        source = np.asarray(source_frames, dtype=np.int64)
+        target = np.asarray(target_frames, dtype=np.float64)
+        # One target per source frame (the mean where the table has several)
+        self.source, inverse = np.unique(source, return_inverse=True)
+        self.target = np.bincount(inverse, weights=target) / np.bincount(inverse)
+        if len(self.source) == 0:
+            raise ValueError("Empty frame remapping table")
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """Right camera onto the left clock from a (left_frame, right_frame) table"""
+        return cls(mapping['right_frame'], mapping['left_frame'])
+
+    def apply(self, frames):
+        frames = np.asarray(frames)
+        mapped = np.interp(frames, self.source, self.target)
+        before, after = frames < self.source[0], frames > self.source[-1]
+        mapped[before] = frames[before] - (self.source[0] - self.target[0])
+        mapped[after] = frames[after] - (self.source[-1] - self.target[-1])
+        return np.rint(mapped).astype(frames.dtype if np.issubdtype(frames.dtype, np.integer) else np.int64)
+
+    def then(self, other):
+        return ComposedAlignment([self, as_alignment(other)])
+
+    def __repr__(self):
+        return f"FrameMap({len(self.source)} frames, {self.source[0]}..{self.source[-1]})"
+
+
+class ComposedAlignment:
+    """Several frame mappings applied in order, e.g. camR -> camM -> camL"""
+
+    def __init__(self, steps):
+        self.steps = []
+        for step in steps:
+            self.steps.extend(step.steps if isinstance(step, ComposedAlignment) else [step])
+
+    def apply(self, frames):
+        for step in self.steps:
+            frames = step.apply(frames)
+        return frames
+
+    def then(self, other):
+        return ComposedAlignment(self.steps + [as_alignment(other)])
+
+    def __repr__(self):
+        return ' -> '.join(repr(step) for step in self.steps)
+
+
+def as_alignment(value):
+    """An alignment from an offset (constant or callable), a (left_frame,
+    right_frame) mapping table or an existing alignment"""
+    if value is None:
+        return FrameShift(0)
+    if isinstance(value, (FrameShift, FrameMap, ComposedAlignment)):
+        return value
+    if isinstance(value, pd.DataFrame):
+        return FrameMap.from_mapping(value)
+    return FrameShift(value)
+
+
+class AlignedView:
+    """A camera table seen on another camera's clock, without copying rows
+
+    Columns are handed out as the underlying arrays; only the frame column
+    is computed, once, on first use. Code that reads columns by name
+    (data['pitch_x'], 'team_id' in data.columns, len(data)) accepts the view
+    in place of the DataFrame, so plotting and stitching consume it directly.
+    """
+
+    def __init__(self, data, alignment=None):
+        if isinstance(data, AlignedView):
+            alignment = data.alignment.then(as_alignment(alignment))
+            data = data.data
+        self.data = data
+        self.alignment = as_alignment(alignment)
+        self._frame = None
+
+    @property
+    def columns(self):
+        return list(self.data.columns) if hasattr(self.data, 'columns') else list(self.data.keys())
+
+    def keys(self):
+        return self.columns
+
+    def __len__(self):
+        return len(self.data['frame'])
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    def __getitem__(self, column):
+        if column != 'frame':
+            return np.asarray(self.data[column])
+        if self._frame is None:
+            self._frame = self.alignment.apply(np.asarray(self.data['frame']))
+        return self._frame
+
+    def aligned(self, alignment):
+        """The same rows with a further mapping composed onto this one"""
+        return AlignedView(self, alignment)
+
+    def store(self):
+        """TrackStore over the aligned rows (per-track and per-frame slices)"""
+        from track_store import TrackStore
+        return TrackStore(self)
+
+    def to_frame(self):
+        """Materialize as a DataFrame (other columns shared where possible)"""
+        return pd.DataFrame({name: self[name] for name in self.columns}, copy=False)
+
+
+def align(data, offset):
+    """Lazy view of a camera table on the reference clock; see AlignedView"""
+    return AlignedView(data, offset)
+
+
+if __name__ == "__main__":
+    import os
+    import time
+    from track_cache import load_tracks
+    from track_store import as_store
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+    right_data = load_tracks(os.path.join(data_dir, 'camR_1.csv'))
+    offset = 1885
+
+    start = time.perf_counter()
+    n = 0
+    for track_id in right_data['tracking_id'].unique():
+        track = right_data[right_data['tracking_id'] == track_id].copy()
+        track['frame'] = track['frame'] - offset
+        n += len(track)
+    copy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    m = sum(len(track['frame']) for _, track in as_store(right_data).aligned(offset).tracks())
+    view_seconds = time.perf_counter() - start
+    print(f"Per-track copies: {copy_seconds:.3f} s, aligned store: {view_seconds:.3f} s ({n} / {m} rows)")
@@ -0,0 +1,169 @@
+import numpy as np
+import plotly.graph_objects as go
+
+
+def _sorted_tracks(data):
+    """Columns sorted by (tracking_id, frame) plus the start index of each track"""
+    ids = np.asarray(data['tracking_id'])
+    frame = np.asarray(data['frame'])
+    order = np.lexsort((frame, ids))
+    ids = ids[order]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.empty(0, np.int64)
+    return order, ids, starts
+
+
+def time_bucket_mask(ids, frame, bucket):
+    """Keep the first point of each track in every bucket of frames
+
+    The last point of each track is always kept so tracks keep their extent.
+    Expects rows sorted by (tracking_id, frame).
+    """
+    if bucket <= 1 or len(ids) == 0:
+        return np.ones(len(ids), dtype=bool)
+    cell = np.asarray(frame) // bucket
+    keep = np.ones(len(ids), dtype=bool)
+    keep[1:] = (ids[1:] != ids[:-1]) | (cell[1:] != cell[:-1])
+    keep[:-1] |= ids[1:] != ids[:-1]
+    keep[-1] = True
+    return keep
+
+
+def douglas_peucker_mask(points, starts, tolerance):
+    """Douglas-Peucker simplification of every track
+
+    points is (n, d), tracks are points[starts[i]:starts[i+1]]. A point is
+    dropped when it lies within tolerance of the chord between kept points.
+    All tracks are processed together one recursion level at a time: the
+    open segments of a level are disjoint, so each level is a handful of
+    array operations over at most n points with segment reductions.
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    ends = np.append(starts[1:], n)
+    keep[starts] = True
+    keep[ends - 1] = True
+
+    long_enough = ends - starts > 2
+    first, last = starts[long_enough], ends[long_enough] - 1
+    while len(first):
+        # Interior points of every open segment, segment by segment
+        counts = last - first - 1
+        offsets_start = np.cumsum(counts) - counts
+        segment = np.repeat(np.arange(len(first)), counts)
+        index = np.arange(counts.sum()) - offsets_start[segment] + first[segment] + 1
+
+        a = points[first]
+        chord = points[last] - a
+        length2 = (chord ** 2).sum(axis=1)
+        offsets = points[index] - a[segment]
+        # Squared distance to the chord: remove the component along it
+        along = (offsets * chord[segment]).sum(axis=1)
+        dist2 = (offsets ** 2).sum(axis=1)
+        dist2 -= np.divide(along ** 2, length2[segment], out=np.zeros_like(along), where=length2[segment] > 0)
+        dist2 = np.maximum(dist2, 0)
+
+        # Farthest point of each segment (the first one on ties)
+        best = np.maximum.reduceat(dist2, offsets_start)
+        candidates = np.flatnonzero(dist2 == best[segment])
+        owner = segment[candidates]
+        split = index[candidates[np.r_[True, owner[1:] != owner[:-1]]]]
+
+        over = best > tolerance ** 2
+        first, split, last = first[over], split[over], last[over]
+        keep[split] = True
+        left = split - first > 1
+        right = last - split > 1
+        first, last = np.concatenate([first[left], split[right]]), np.concatenate([split[left], last[right]])
+    return keep
+
+
+def pack_tracks(data, decimate='dp', bucket=3, tolerance=2.0, z_offset=0, extra=()):
+    """Pack all tracks into single x/y/z arrays separated by NaN
+
+    decimate: None, 'time' (one point per `bucket` frames per track) or
+    'dp' (Douglas-Peucker with `tolerance` in pitch/frame units).
+    z_offset is subtracted from the frame numbers. Columns named in extra are
+    packed alongside (NaN at the separators) and returned in a dict.
+    """
+    order, ids, starts = _sorted_tracks(data)
+    x = np.asarray(data['pitch_x'], dtype=np.float32)[order]
+    y = np.asarray(data['pitch_y'], dtype=np.float32)[order]
+    frame = np.asarray(data['frame'])[order]
+    columns = {name: np.asarray(data[name])[order] for name in extra}
+
+    if decimate == 'time':
+        keep = time_bucket_mask(ids, frame, bucket)
+    elif decimate == 'dp':
+        keep = douglas_peucker_mask(np.column_stack([x, y, frame]).astype(np.float64), starts, tolerance)
+    else:
+        keep = np.ones(len(ids), dtype=bool)
+
+    ids = ids[keep]
+    x, y, frame = x[keep], y[keep], frame[keep]
+    columns = {name: values[keep] for name, values in columns.items()}
+
+    # Insert one NaN after every track (except the last) so plotly breaks the line
+    n_tracks = int(np.count_nonzero(np.r_[True, ids[1:] != ids[:-1]])) if len(ids) else 0
+    track_index = np.cumsum(np.r_[False, ids[1:] != ids[:-1]]) if len(ids) else np.empty(0, np.int64)
+    size = len(ids) + max(n_tracks - 1, 0)
+    positions = np.arange(len(ids)) + track_index
+
+    def spread(values):
+        out = np.full(size, np.nan, dtype=np.float32)
+        out[positions] = values
+        return out
+
+    packed = {
+        'x': spread(x),
+        'y': spread(y),
+        'z': spread(frame - z_offset),
+        'n_tracks': n_tracks
+    }
+    packed['extra'] = {name: spread(values) for name, values in columns.items()}
+    return packed
+
+
+def packed_trace(data, name, color='white', color_by=None, color_map=None, decimate='dp',
+                 bucket=3, tolerance=2.0, z_offset=0, width=2, opacity=0.6, unknown_color='gray', **kwargs):
+    """One Scatter3d holding every track in data
+
+    With color_by (e.g. 'team_id') and color_map ({value: color}), each point
+    is coloured by that column through a discrete colorscale instead of
+    splitting the data into one trace per value. Values missing from
+    color_map are drawn in unknown_color.
+    """
+    packed = pack_tracks(data, decimate, bucket, tolerance, z_offset,
+                         extra=(color_by,) if color_by else ())
+    line = dict(color=color, width=width)
+
+    if color_by:
+        values = sorted(color_map)
+        # Separators carry no colour, so small integer codes are enough
+        raw = np.nan_to_num(packed['extra'][color_by], nan=values[0])
+        position = np.minimum(np.searchsorted(values, raw), len(values) - 1)
+        known = np.asarray(values, dtype=raw.dtype)[position] == raw
+        # Code i maps to color_map[values[i]]; code len(values) to unknown_color
+        colors = [color_map[value] for value in values]
+        if not known.all():
+            colors.append(unknown_color)
+        codes = np.where(known, position, len(values)).astype(np.uint8 if len(colors) < 256 else np.int32)
+        k = len(colors)
+        scale = []
+        for i, value_color in enumerate(colors):
+            scale.append([i / k, value_color])
+            scale.append([(i + 1) / k, value_color])
+        line = dict(color=codes, colorscale=scale, cmin=-0.5, cmax=k - 0.5, width=width)
+
+    return go.Scatter3d(
+        x=packed['x'],
+        y=packed['y'],
+        z=packed['z'],
+        mode='lines',
+        name=f"{name} ({packed['n_tracks']} tracks)",
+        line=line,
+        opacity=opacity,
+        connectgaps=False,
+        **kwargs
+    )
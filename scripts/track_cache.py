@@ -0,0 +1,203 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from instrument import timed
+
+CACHE_DIR_NAME = '.track_cache'
+CACHE_VERSION = 2
+
+# Compact dtypes for the known tracking columns
+COLUMN_DTYPES = {
+    'frame': np.int32,
+    'tracking_id': np.int32,
+    'team_id': np.int8,
+    'pitch_x': np.float32,
+    'pitch_y': np.float32,
+    'velocity': np.float32
+}
+
+
+def cache_path(csv_path, cache_dir=None):
+    """Directory holding the column files for csv_path"""
+    csv_path = os.path.abspath(csv_path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(csv_path), CACHE_DIR_NAME)
+    return os.path.join(cache_dir, os.path.basename(csv_path))
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def compact_column(values, name):
+    """Convert a column to its cache dtype
+
+    Floats always become float32. Integer columns are narrowed only when
+    they have no missing values and every value fits; otherwise they are kept
+    as they are (float32 if they have missing values).
+    """
+    if name in COLUMN_DTYPES:
+        target = COLUMN_DTYPES[name]
+        if np.issubdtype(target, np.integer):
+            # Integer columns with missing values stay as floats
+            if values.isna().any():
+                return values.to_numpy(dtype=np.float32)
+            info = np.iinfo(target)
+            if values.min() < info.min or values.max() > info.max:
+                return values.to_numpy()
+        return values.to_numpy(dtype=target)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy()
+    return values.astype(str).to_numpy(dtype=str)
+
+
+def build_cache(csv_path, cache_dir=None):
+    """Convert a camera CSV into one .npy file per column"""
+    target = cache_path(csv_path, cache_dir)
+    stamp = _source_stamp(csv_path)
+    data = pd.read_csv(csv_path)
+
+    # A private build directory, so concurrent builders never touch each other's files
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=os.path.basename(target) + '.', suffix='.tmp', dir=os.path.dirname(target))
+
+    columns = []
+    for name in data.columns:
+        values = compact_column(data[name], name)
+        np.save(os.path.join(tmp, f"{len(columns)}.npy"), values)
+        columns.append({'name': name, 'dtype': values.dtype.str})
+
+    meta = {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(csv_path),
+        'source_stamp': stamp,
+        'source_hash': file_hash(csv_path),
+        'rows': len(data),
+        'frame_range': [int(data['frame'].min()), int(data['frame'].max())] if len(data) else None,
+        'columns': columns
+    }
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    # Swap the finished cache in so readers never see a partial one. A
+    # non-empty directory cannot be replaced in one step, so the old cache is
+    # first renamed aside; if another builder got there first, its cache is
+    # just as good and this one is dropped.
+    old = None
+    if os.path.exists(target):
+        old = tempfile.mkdtemp(prefix=os.path.basename(target) + '.', suffix='.old', dir=os.path.dirname(target))
+        try:
+            os.replace(target, old)
+        except OSError:
+            pass
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+
+def _read_meta(target):
+    try:
+        with open(os.path.join(target, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def cache_meta(csv_path, cache_dir=None):
+    """Metadata of a camera's cache (None when it has not been built)"""
+    return _read_meta(cache_path(csv_path, cache_dir))
+
+
+def frame_extent(csv_path, cache_dir=None):
+    """(first_frame, last_frame) from a cache that is current for csv_path
+
+    Only reads the metadata, so it is cheap enough for request handlers;
+    None when the cache is missing or its stamp no longer matches the file,
+    (None, None) for a file without rows.
+    """
+    meta = cache_meta(csv_path, cache_dir)
+    if meta is None or meta.get('version') != CACHE_VERSION or meta['source_stamp'] != _source_stamp(csv_path):
+        return None
+    return tuple(meta['frame_range'] or (None, None))
+
+
+def is_cache_valid(csv_path, meta, verify_hash=False):
+    """Check a cache's metadata against the current source file
+
+    A changed mtime/size only invalidates the cache if the contents changed
+    too, so touching or copying the CSV does not force a rebuild.
+    """
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        return False
+    stamp = _source_stamp(csv_path)
+    if stamp == meta['source_stamp'] and not verify_hash:
+        return True
+    if stamp['size'] != meta['source_stamp']['size']:
+        return False
+    return file_hash(csv_path) == meta['source_hash']
+
+
+@timed()
+def load_tracks(csv_path, cache_dir=None, verify_hash=False, mmap=True):
+    """Load a camera CSV through the columnar cache
+
+    The first call parses the CSV and writes the cache; later calls memory-map
+    the column files (copy-on-write, so callers may still modify the frame).
+    The cache is rebuilt automatically when the source file changes.
+    """
+    target = cache_path(csv_path, cache_dir)
+    meta = _read_meta(target)
+
+    if not is_cache_valid(csv_path, meta, verify_hash):
+        meta = build_cache(csv_path, cache_dir)
+    elif meta['source_stamp'] != _source_stamp(csv_path):
+        # Same contents with a new mtime: refresh the stamp to skip hashing next time
+        meta['source_stamp'] = _source_stamp(csv_path)
+        with open(os.path.join(target, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    mmap_mode = 'c' if mmap else None
+    columns = {
+        column['name']: np.load(os.path.join(target, f"{i}.npy"), mmap_mode=mmap_mode)
+        for i, column in enumerate(meta['columns'])
+    }
+    return pd.DataFrame(columns, copy=False)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+
+    paths = sys.argv[1:] or [
+        os.path.join(data_dir, name) for name in ['camL_1.csv', 'camM_1.csv', 'camR_1.csv']
+    ]
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"File not found: {path}")
+            continue
+        start = time.perf_counter()
+        data = load_tracks(path)
+        elapsed = time.perf_counter() - start
+        print(f"{os.path.basename(path)}: {len(data)} rows in {elapsed * 1000:.1f} ms "
+              f"({data.memory_usage(deep=True).sum() / 1e6:.1f} MB)")
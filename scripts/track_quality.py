@@ -0,0 +1,122 @@
+import pandas as pd
+import numpy as np
+from instrument import timed
+
+# Quality filtering parameters shared by all visualisers
+VELOCITY_THRESHOLD = 50
+MIN_TRACK_LENGTH = 30
+MAX_POSITION_JUMP = 50
+
+
+def _segment_max(values, starts):
+    """NaN-ignoring max of each segment values[starts[i]:starts[i+1]]"""
+    if len(values) == 0:
+        return np.empty(0)
+    return np.fmax.reduceat(values, starts)
+
+
+@timed()
+def track_quality(data, velocity_threshold=VELOCITY_THRESHOLD, min_track_length=MIN_TRACK_LENGTH,
+                  max_position_jump=MAX_POSITION_JUMP, check_duplicates=False):
+    """Per-track quality table computed in a single segmented pass
+
+    Rows are grouped by tracking_id with a stable sort, so position jumps are
+    measured between consecutive rows of a track in file order, as before.
+    Returns a DataFrame indexed by tracking_id with length, max_velocity,
+    max_x_jump, max_y_jump, duplicate_frames, valid and reason (comma separated
+    list of failed checks, empty for valid tracks). Duplicate frames only
+    fail a track when check_duplicates is set.
+    """
+    ids = np.asarray(data['tracking_id'])
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    track_ids, starts, lengths = np.unique(ids, return_index=True, return_counts=True)
+    first_row = np.zeros(len(ids), dtype=bool)
+    first_row[starts] = True
+
+    def jumps(column):
+        values = np.asarray(data[column], dtype=np.float64)[order]
+        jump = np.abs(np.diff(values, prepend=np.nan))
+        jump[first_row] = np.nan
+        return _segment_max(jump, starts)
+
+    if 'velocity' in data.columns:
+        velocity = np.asarray(data['velocity'], dtype=np.float64)[order]
+        max_velocity = _segment_max(velocity, starts)
+    else:
+        max_velocity = np.zeros(len(track_ids))
+
+    # Duplicate frames: equal consecutive frames after sorting each track by frame
+    frame = np.asarray(data['frame'])
+    by_frame = np.lexsort((frame, np.asarray(data['tracking_id'])))
+    sorted_frame = frame[by_frame]
+    repeated = np.zeros(len(ids), dtype=bool)
+    repeated[1:] = sorted_frame[1:] == sorted_frame[:-1]
+    repeated &= ~first_row
+    duplicate_frames = np.add.reduceat(repeated.astype(np.int64), starts) if len(ids) else np.empty(0, np.int64)
+
+    quality = pd.DataFrame({
+        'length': lengths,
+        'max_velocity': max_velocity,
+        'max_x_jump': jumps('pitch_x'),
+        'max_y_jump': jumps('pitch_y'),
+        'duplicate_frames': duplicate_frames
+    }, index=pd.Index(track_ids, name='tracking_id'))
+
+    return apply_quality_checks(quality, velocity_threshold, min_track_length, max_position_jump,
+                                check_duplicates)
+
+
+def apply_quality_checks(quality, velocity_threshold=VELOCITY_THRESHOLD, min_track_length=MIN_TRACK_LENGTH,
+                         max_position_jump=MAX_POSITION_JUMP, check_duplicates=False):
+    """Add the reason and valid columns to a table of per-track statistics"""
+    # NaN statistics fail their check, matching the old `nan <= threshold` behaviour
+    checks = {
+        'too_short': quality['length'] < min_track_length,
+        'velocity': ~(quality['max_velocity'] <= velocity_threshold),
+        'x_jump': ~(quality['max_x_jump'] <= max_position_jump),
+        'y_jump': ~(quality['max_y_jump'] <= max_position_jump)
+    }
+    if check_duplicates:
+        checks['duplicate_frames'] = quality['duplicate_frames'] > 0
+
+    reason = pd.Series('', index=quality.index)
+    for name, failed in checks.items():
+        reason = reason + np.where(failed, name + ',', '')
+    quality['reason'] = reason.str.rstrip(',')
+    quality['valid'] = quality['reason'] == ''
+
+    return quality
+
+
+@timed()
+def filter_tracks(data, check_duplicates=False, **thresholds):
+    """Keep only the rows of tracks that pass the quality checks"""
+    quality = track_quality(data, check_duplicates=check_duplicates, **thresholds)
+    valid_track_ids = quality.index[quality['valid']]
+    return data[np.isin(np.asarray(data['tracking_id']), valid_track_ids)]
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    from track_cache import load_tracks
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+
+    paths = sys.argv[1:] or [
+        os.path.join(data_dir, name) for name in ['camL_1.csv', 'camM_1.csv', 'camR_1.csv']
+    ]
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"File not found: {path}")
+            continue
+        data = load_tracks(path)
+        start = time.perf_counter()
+        quality = track_quality(data, check_duplicates=True)
+        elapsed = time.perf_counter() - start
+        print(f"\n{os.path.basename(path)}: {quality['valid'].sum()}/{len(quality)} tracks valid "
+              f"({elapsed * 1000:.1f} ms)")
+        print(quality.loc[~quality['valid'], 'reason'].value_counts().to_string())
@@ -0,0 +1,134 @@
+import pandas as pd
+import numpy as np
+from track_cache import load_tracks
+
+
+class TrackStore:
+    """Camera tracking rows indexed by track and by frame
+
+    Rows are kept twice, once sorted by (tracking_id, frame) and once by
+    frame, with offset arrays into each ordering. track(), frame() and
+    frame_range() therefore return zero-copy slices instead of scanning the
+    whole table with a boolean mask.
+
+    Lookups return a dict of column name -> numpy view, so code written for
+    a DataFrame (track['pitch_x'], track['frame']) works unchanged. Indexing
+    the store itself by column name returns the full column in frame order.
+    """
+
+    def __init__(self, data):
+        self.columns = list(data.columns) if hasattr(data, 'columns') else list(data.keys())
+        columns = {name: np.asarray(data[name]) for name in self.columns}
+
+        frame = columns['frame']
+        track_order = np.lexsort((frame, columns['tracking_id']))
+        frame_order = np.argsort(frame, kind='stable')
+        self._build(
+            {name: values[track_order] for name, values in columns.items()},
+            {name: values[frame_order] for name, values in columns.items()}
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        """Build a store from a camera CSV (through the columnar cache)"""
+        return cls(load_tracks(csv_path))
+
+    @classmethod
+    def _from_sorted(cls, columns, by_track, by_frame):
+        store = cls.__new__(cls)
+        store.columns = columns
+        store._build(by_track, by_frame)
+        return store
+
+    def _build(self, by_track, by_frame):
+        self._by_track = by_track
+        self._by_frame = by_frame
+
+        self.track_ids, starts = np.unique(by_track['tracking_id'], return_index=True)
+        self._track_starts = np.append(starts, len(by_track['tracking_id']))
+        self._track_pos = {track_id: i for i, track_id in enumerate(self.track_ids.tolist())}
+
+        self.frames, starts = np.unique(by_frame['frame'], return_index=True)
+        self._frame_starts = np.append(starts, len(by_frame['frame']))
+        self._frame_pos = {frame: i for i, frame in enumerate(self.frames.tolist())}
+
+    def __len__(self):
+        return len(self._by_frame['frame'])
+
+    def __getitem__(self, column):
+        return self._by_frame[column]
+
+    def _slice(self, columns, start, end):
+        return {name: values[start:end] for name, values in columns.items()}
+
+    def track(self, track_id):
+        """All rows of one track, ordered by frame"""
+        i = self._track_pos.get(track_id)
+        if i is None:
+            return self._slice(self._by_track, 0, 0)
+        return self._slice(self._by_track, self._track_starts[i], self._track_starts[i + 1])
+
+    def tracks(self):
+        """Iterate over (track_id, rows) for every track"""
+        for i, track_id in enumerate(self.track_ids.tolist()):
+            yield track_id, self._slice(self._by_track, self._track_starts[i], self._track_starts[i + 1])
+
+    def frame(self, frame):
+        """All rows recorded at one frame"""
+        i = self._frame_pos.get(frame)
+        if i is None:
+            return self._slice(self._by_frame, 0, 0)
+        return self._slice(self._by_frame, self._frame_starts[i], self._frame_starts[i + 1])
+
+    def frame_range(self, start, end):
+        """All rows with start <= frame <= end, ordered by frame"""
+        lo = np.searchsorted(self._by_frame['frame'], start, side='left')
+        hi = np.searchsorted(self._by_frame['frame'], end, side='right')
+        return self._slice(self._by_frame, lo, hi)
+
+    def track_lengths(self):
+        """Number of rows per track, aligned with track_ids"""
+        return np.diff(self._track_starts)
+
+    def frame_counts(self):
+        """Number of rows per frame, aligned with frames"""
+        return np.diff(self._frame_starts)
+
+    def in_x_band(self, x_range):
+        """New store restricted to rows with x_range[0] <= pitch_x <= x_range[1]
+
+        Filtering keeps both sort orders, so no re-sorting is needed.
+        """
+        def band(columns):
+            x = columns['pitch_x']
+            keep = (x >= x_range[0]) & (x <= x_range[1])
+            return {name: values[keep] for name, values in columns.items()}
+
+        return TrackStore._from_sorted(self.columns, band(self._by_track), band(self._by_frame))
+
+    def aligned(self, alignment):
+        """New store on another clock (offset, mapping table or time_align alignment)
+
+        Only the frame arrays are recomputed; every other column is shared
+        with this store, and both sort orders are kept as long as the mapping
+        preserves frame order.
+        """
+        from time_align import as_alignment
+        alignment = as_alignment(alignment)
+        by_track = dict(self._by_track, frame=alignment.apply(self._by_track['frame']))
+        by_frame = dict(self._by_frame, frame=alignment.apply(self._by_frame['frame']))
+        if (np.diff(by_frame['frame']) < 0).any():
+            order = np.argsort(by_frame['frame'], kind='stable')
+            by_frame = {name: values[order] for name, values in by_frame.items()}
+        return TrackStore._from_sorted(self.columns, by_track, by_frame)
+
+    def to_frame(self):
+        """Rows as a DataFrame, in frame order"""
+        return pd.DataFrame({name: self._by_frame[name] for name in self.columns}, copy=False)
+
+
+def as_store(data):
+    """Return data as a TrackStore, building one if it is a DataFrame"""
+    if isinstance(data, TrackStore):
+        return data
+    return TrackStore(data)
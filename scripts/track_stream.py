@@ -0,0 +1,231 @@
+import pandas as pd
+import numpy as np
+import os
+from sync_estimator import overlap_rows, overlap_signals
+from track_quality import track_quality, apply_quality_checks
+
+# Rows read per chunk; peak memory is a few times this, whatever the match length
+CHUNK_ROWS = 500_000
+
+STREAM_DTYPES = {
+    'frame': np.int32,
+    'tracking_id': np.int32,
+    'pitch_x': np.float32,
+    'pitch_y': np.float32,
+    'velocity': np.float32
+}
+
+
+def iter_frame_chunks(csv_path, chunk_rows=CHUNK_ROWS, usecols=None, compact=True):
+    """Read a frame-ordered camera CSV in chunks that only contain whole frames
+
+    The rows of the last frame of each chunk are held back and prepended to
+    the next one, so per-frame statistics never straddle two chunks. Raises
+    ValueError if the file is not sorted by frame. compact=False keeps
+    pandas' default dtypes (full precision when rows are written back out).
+    """
+    pending = None
+    dtype = {c: t for c, t in STREAM_DTYPES.items() if usecols is None or c in usecols} if compact else None
+    reader = pd.read_csv(csv_path, chunksize=chunk_rows, usecols=usecols, dtype=dtype)
+    for chunk in reader:
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        frame = chunk['frame'].to_numpy()
+        if (np.diff(frame) < 0).any():
+            raise ValueError(f"{os.path.basename(csv_path)} is not sorted by frame")
+
+        split = int(np.searchsorted(frame, frame[-1]))
+        pending = chunk.iloc[split:]
+        if split > 0:
+            yield chunk.iloc[:split]
+    if pending is not None and len(pending):
+        yield pending
+
+
+def last_frame(csv_path, block_size=1 << 16):
+    """Frame number of the last row, read from the end of the file"""
+    with open(csv_path, 'rb') as f:
+        header = f.readline().decode().strip().split(',')
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(size - block_size, 0))
+        lines = [line for line in f.read().decode(errors='ignore').splitlines() if line.strip()]
+    return int(float(lines[-1].split(',')[header.index('frame')]))
+
+
+def read_frame_range(csv_path, start, end, chunk_rows=CHUNK_ROWS, usecols=None):
+    """Rows with start <= frame <= end, stopping as soon as the range is passed"""
+    parts = []
+    for chunk in iter_frame_chunks(csv_path, chunk_rows, usecols):
+        frame = chunk['frame'].to_numpy()
+        if frame[0] > end:
+            break
+        parts.append(chunk[(frame >= start) & (frame <= end)])
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+class FrameCounts:
+    """Rows and distinct tracks per frame"""
+
+    def __init__(self):
+        self.parts = []
+
+    def update(self, chunk):
+        counts = chunk.groupby('frame', sort=False)['tracking_id'].agg(['size', 'nunique'])
+        self.parts.append(counts.rename(columns={'size': 'rows', 'nunique': 'tracks'}))
+
+    def result(self):
+        if not self.parts:
+            return pd.DataFrame(columns=['rows', 'tracks'])
+        return pd.concat(self.parts)
+
+
+class StreamingQuality:
+    """track_quality over a stream of chunks
+
+    Only one row per track (its last position) is carried between chunks, so
+    position jumps across chunk boundaries are still measured and the final
+    table equals track_quality on the whole file.
+    """
+
+    def __init__(self, **thresholds):
+        self.thresholds = thresholds
+        self.stats = None
+        self.last = None
+
+    def update(self, chunk):
+        ids = chunk['tracking_id'].to_numpy()
+        columns = ['tracking_id', 'frame', 'pitch_x', 'pitch_y']
+        carry = None
+        if self.last is not None:
+            carry = self.last[self.last['tracking_id'].isin(ids)]
+            rows = pd.concat([carry, chunk[columns + (['velocity'] if 'velocity' in chunk.columns else [])]],
+                             ignore_index=True)
+        else:
+            rows = chunk
+
+        stats = track_quality(rows).drop(columns=['reason', 'valid'])
+        if carry is not None and len(carry):
+            # The carried row was already counted in the previous chunk
+            stats.loc[carry['tracking_id'].to_numpy(), 'length'] -= 1
+
+        if self.stats is None:
+            self.stats = stats
+        else:
+            combined = self.stats.reindex(self.stats.index.union(stats.index))
+            new = stats.reindex(combined.index)
+            combined['length'] = combined['length'].fillna(0) + new['length'].fillna(0)
+            combined['duplicate_frames'] = combined['duplicate_frames'].fillna(0) + new['duplicate_frames'].fillna(0)
+            for column in ['max_velocity', 'max_x_jump', 'max_y_jump']:
+                combined[column] = np.fmax(combined[column], new[column])
+            self.stats = combined.astype({'length': np.int64, 'duplicate_frames': np.int64})
+
+        # Last row (in file order) of every track seen in this chunk
+        reverse = ids[::-1]
+        _, last_index = np.unique(reverse, return_index=True)
+        latest = chunk.iloc[len(ids) - 1 - last_index][columns]
+        if self.last is None:
+            self.last = latest.reset_index(drop=True)
+        else:
+            kept = self.last[~self.last['tracking_id'].isin(latest['tracking_id'])]
+            self.last = pd.concat([kept, latest], ignore_index=True)
+
+    def result(self, check_duplicates=False):
+        return apply_quality_checks(self.stats.copy(), check_duplicates=check_duplicates, **self.thresholds)
+
+
+class OverlapExtractor:
+    """Rows inside an x band, appended to a CSV as they stream past"""
+
+    def __init__(self, overlap_x_range, output_path=None):
+        self.overlap_x_range = overlap_x_range
+        self.output_path = output_path
+        self.parts = []
+        self.rows = 0
+
+    def update(self, chunk):
+        band = chunk[overlap_rows(chunk, self.overlap_x_range)]
+        if self.output_path:
+            band.to_csv(self.output_path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        else:
+            self.parts.append(band)
+        self.rows += len(band)
+
+    def result(self):
+        if self.output_path:
+            return self.rows
+        return pd.concat(self.parts, ignore_index=True) if self.parts else pd.DataFrame()
+
+
+class SignalAccumulator:
+    """overlap_signals built chunk by chunk
+
+    y_range and teams must be fixed up front (they are derived from the data
+    in the in-memory estimator). Returns (frame_start, signals) like the
+    arrays passed to sync_estimator.estimate_from_signals.
+    """
+
+    def __init__(self, overlap_x_range, y_range=(0, 700), y_bins=8, teams=(1, 2)):
+        self.args = (overlap_x_range, y_range, y_bins, teams)
+        self.parts = []
+
+    def update(self, chunk):
+        frame = chunk['frame'].to_numpy()
+        start, end = int(frame[0]), int(frame[-1])
+        self.parts.append((start, overlap_signals(chunk, start, end - start + 1, *self.args)))
+
+    def result(self):
+        if not self.parts:
+            return 0, None
+        start = self.parts[0][0]
+        end = self.parts[-1][0] + self.parts[-1][1].shape[1]
+        signals = np.zeros((self.parts[0][1].shape[0], end - start), dtype=np.float32)
+        for part_start, part in self.parts:
+            signals[:, part_start - start:part_start - start + part.shape[1]] = part
+        return start, signals
+
+
+def stream_match(csv_path, overlap_x_range=(290, 320), overlap_output=None, chunk_rows=CHUNK_ROWS,
+                 y_range=(0, 700), y_bins=8, teams=(1, 2)):
+    """One pass over a camera CSV computing everything the sync scripts need
+
+    Returns a dict with rows, frame_counts, quality, overlap (rows or the
+    number written to overlap_output) and signals ((frame_start, array)).
+    """
+    accumulators = {
+        'frame_counts': FrameCounts(),
+        'quality': StreamingQuality(),
+        'overlap': OverlapExtractor(overlap_x_range, overlap_output),
+        'signals': SignalAccumulator(overlap_x_range, y_range, y_bins, teams)
+    }
+    rows = 0
+    for chunk in iter_frame_chunks(csv_path, chunk_rows):
+        rows += len(chunk)
+        for accumulator in accumulators.values():
+            accumulator.update(chunk)
+
+    result = {name: accumulator.result() for name, accumulator in accumulators.items()}
+    result['rows'] = rows
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import resource
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+    paths = sys.argv[1:] or [os.path.join(data_dir, 'camL_1.csv'), os.path.join(data_dir, 'camR_1.csv')]
+
+    for path in paths:
+        start = time.perf_counter()
+        result = stream_match(path, overlap_x_range=(463, 619))
+        elapsed = time.perf_counter() - start
+        quality = result['quality']
+        print(f"\n{os.path.basename(path)}: {result['rows']} rows in {elapsed:.2f} s")
+        print(f"  frames: {len(result['frame_counts'])}, "
+              f"tracks valid: {quality['valid'].sum()}/{len(quality)}, "
+              f"overlap rows: {len(result['overlap'])}, "
+              f"signals: {result['signals'][1].shape}")
+    print(f"\nPeak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
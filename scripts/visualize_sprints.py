@@ -1,6 +1,7 @@
 import pandas as pd
 import plotly.graph_objects as go
 import os
+from track_store import as_store
 
 def load_sprint_data(file_path, frame_range=None):
     """Load data for a specific frame range"""
@@ -41,8 +42,7 @@ def create_sprint_visualization():
         data = load_sprint_data(info['file'], info['frames'])
         
         # Plot each track in the sprint
-        for track_id in data['tracking_id'].unique():
-            track_data = data[data['tracking_id'] == track_id].copy()
+        for track_id, track_data in as_store(data).tracks():
             
             fig.add_trace(
                 go.Scatter3d(